@@ -1,10 +1,60 @@
-from flask import Flask, render_template, request, send_from_directory, jsonify, url_for, render_template_string
+from flask import Flask, Response, render_template, request, send_from_directory, jsonify, stream_with_context, url_for, render_template_string
 import os
 import csv
-from prompt import generate_food_exercise, generate_important, generate_routine
-from map import get_coordinates, get_hospitals, create_map
+import io
+import itertools
+import json
+import threading
+from catalog import disease_catalog
+from prompt import InvalidProfile, cache_key, clean_key, generate_bundle, generate_food_exercise, generate_important, generate_routine, inflight, llm_gate, precomputed, read_profile, response_cache, stream_content, warm_up
+from assets import init_assets
+from cache import hash_text, make_key
+from http_compression import etagged, init_compression
+from sanitize import Sanitizer
+from http_client import http
+from limits import Overloaded
+from metrics import cache_collector, init_metrics, registry, stats_collector
+from user_store import COLUMNS as USER_COLUMNS, UserStore
+from map import MAP_DIR, geocode_cache, get_coordinates, get_hospitals, create_map, iter_hospitals, tile_cache
 
 app = Flask(__name__)
+init_assets(app)
+init_metrics(app, server_timing=os.environ.get("SERVER_TIMING", "1") == "1")
+if os.environ.get("COMPRESSION", "1") == "1":
+    init_compression(app)
+registry.add_collector(cache_collector({"response": response_cache, "geocode": geocode_cache, "tile": tile_cache}))
+registry.add_collector(stats_collector("livehealthy_llm", llm_gate.stats))
+registry.add_collector(stats_collector("livehealthy_singleflight", inflight.stats))
+registry.add_collector(stats_collector("livehealthy_http", http.stats))
+registry.add_collector(stats_collector("livehealthy_precomputed", precomputed.stats))
+
+# -----------------------------------------------
+# Warm up the LLM client once the server is taking requests
+# -----------------------------------------------
+_warm_up_started = False
+
+@app.before_request
+def start_warm_up():
+    global _warm_up_started
+    if not _warm_up_started and os.environ.get("WARM_UP", "1") == "1":
+        _warm_up_started = True
+        threading.Thread(target=warm_up, name="llm-warm-up", daemon=True).start()
+
+# -----------------------------------------------
+# Error handlers
+# -----------------------------------------------
+# Reject quickly when the model is saturated
+@app.errorhandler(Overloaded)
+def overloaded(e):
+    response = jsonify({"content": None, "error": str(e)})
+    response.status_code = e.status
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response
+
+# Form could not be turned into a prompt (bad weight, unknown disease)
+@app.errorhandler(InvalidProfile)
+def invalid_profile(e):
+    return jsonify({"content": None, "error": str(e)}), 400
 
 # -----------------------------------------------
 # Serve images
@@ -17,24 +67,21 @@ def image(filename):
 # Load diseases
 # -----------------------------------------------
 def load_diseases():
-    diseases = []
-    if os.path.exists("disease.csv"):
-        with open("disease.csv", newline="") as csvfile:
-            reader = csv.reader(csvfile)
-            for row in reader:
-                diseases.append(row[0].strip())
-    return diseases
+    return disease_catalog.names
+
+@app.route("/diseases/search")
+def search_diseases():
+    limit = min(request.args.get("limit", 10, type=int), 50)
+    return jsonify(disease_catalog.search(request.args.get("q", ""), limit=limit))
 
 # -----------------------------------------------
 # Save user data
 # -----------------------------------------------
+user_store = UserStore(os.environ.get("USER_DB", "user_data.sqlite3"))
+user_store.import_csv("user_data.csv")
+
 def save_user_data(name, age, weight, height, disease_list):
-    file_exists = os.path.isfile("user_data.csv")
-    with open("user_data.csv", "a", newline="") as csvfile:
-        writer = csv.writer(csvfile)
-        if not file_exists:
-            writer.writerow(["Name", "Age", "Weight", "Height", "Disease"])
-        writer.writerow([name, age, weight, height, ";".join(disease_list)])
+    user_store.append(name, age, weight, height, disease_list)
 
 # -----------------------------------------------
 # Base health form
@@ -50,7 +97,7 @@ def health_form():
             "height": request.form.get("height"),
             "sex": request.form.get("sex"),
             "race": request.form.get("race"),
-            "disease": request.form.getlist("disease")
+            "disease": [d for d in (disease_catalog.canonical(n) for n in request.form.getlist("disease")) if d]
         }
         save_user_data(
             form_data["name"],
@@ -66,70 +113,232 @@ def health_form():
 # Basic navigation routes
 # -----------------------------------------------
 @app.route("/")
+@etagged
 def home():
     return render_template("base.html", page="home")
 
 @app.route("/ask")
+@etagged
 def ask():
     diseases = load_diseases()
     return render_template("ask.html", page="ask", diseases=diseases)
 
 @app.route("/answer")
+@etagged
 def answer():
     return render_template("answer.html", page="answer")
 
 @app.route("/about")
+@etagged
 def about():
     return render_template("about.html", page="about")
 
 @app.route("/map")
+@etagged
 def map():
     return render_template("map.html", page="map")
 
+VIEW_OUTPUT_TEMPLATE = """
+<table border="1" cellpadding="4">
+  <tr>{% for c in columns %}<th>{{ c }}</th>{% endfor %}</tr>
+  {% for row in rows %}<tr>{% for v in row %}<td>{{ v }}</td>{% endfor %}</tr>{% endfor %}
+</table>
+<p>
+  {% if page > 1 %}<a href="?page={{ page - 1 }}&per_page={{ per_page }}">Newer</a>{% endif %}
+  {% if has_more %}<a href="?page={{ page + 1 }}&per_page={{ per_page }}">Older</a>{% endif %}
+  <a href="?format=csv">Download CSV</a>
+</p>
+"""
+
 @app.route("/view-output")
 def view_output():
-    with open("user_data.csv", "r") as f:
-        content = f.read()
-    return render_template_string("<pre>{{content}}</pre>", content=content)
+    if request.args.get("format") == "csv":
+        def rows():
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(USER_COLUMNS)
+            for row in user_store.iter_rows():
+                writer.writerow(row)
+                if buffer.tell() > 65536:
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+            yield buffer.getvalue()
+        return Response(rows(), mimetype="text/csv", headers={"Content-Disposition": "attachment; filename=user_data.csv"})
+
+    page = max(request.args.get("page", 1, type=int), 1)
+    per_page = min(max(request.args.get("per_page", 50, type=int), 1), 500)
+    rows, has_more = user_store.page(page, per_page)
+    return render_template_string(
+        VIEW_OUTPUT_TEMPLATE, columns=USER_COLUMNS, rows=rows, page=page, per_page=per_page, has_more=has_more
+    )
 
 # -----------------------------------------------
 # Map search logic
 # -----------------------------------------------
+# "folium" renders the map page on the server; "client" returns JSON and
+# lets static/hospital_map.html draw it in the browser
+MAP_RENDER = os.environ.get("MAP_RENDER", "folium")
+SEARCH_RADIUS = 8000
+MAX_SEARCH_RADIUS = 50000
+
 @app.route('/search_location', methods=['POST'])
 def search_location():
+    """
+    Only geocodes: the page is returned as soon as the coordinates are known
+    and fetches the hospitals from /api/hospitals/stream while it is shown.
+    """
     zip_code = request.form.get('zip')
     country = request.form.get('country')
     lat, lon = get_coordinates(zip_code, country)
     if not lat or not lon:
         return render_template("map.html", page="map", error="❌ Could not locate that postal code.", hospitals=[])
-    hospitals = get_hospitals(lat, lon, radius=8000)
-    map_path = os.path.join('static', 'hospitals_near_me.html')
-    create_map(lat, lon, hospitals, zip_code, country)
-    if os.path.exists("hospitals_near_me.html"):
-        os.replace("hospitals_near_me.html", map_path)
+    map_file = None
+    if MAP_RENDER == "client":
+        # The map frame draws the map from /api/hospitals/stream and passes the
+        # batches on to the page for the list, so each view opens one stream
+        map_file = url_for('static', filename='hospital_map.html', lat=lat, lon=lon, radius=SEARCH_RADIUS, label=f"{zip_code}, {country}")
+    stream_url = url_for('hospitals_stream', lat=lat, lon=lon, radius=SEARCH_RADIUS, zip=zip_code, country=country)
     return render_template(
         "map.html",
         page="map",
-        hospitals=hospitals,
+        hospitals=[],
         zip_code=zip_code,
         country=country,
-        map_file=url_for('static', filename='hospitals_near_me.html')
+        map_file=map_file,
+        stream_url=stream_url,
+        center=[lat, lon],
     )
 
+def _search_area():
+    """(lat, lon, radius) from the query string, or None if lat/lon are missing or invalid."""
+    try:
+        lat = float(request.args["lat"])
+        lon = float(request.args["lon"])
+        radius = min(int(request.args.get("radius", SEARCH_RADIUS)), MAX_SEARCH_RADIUS)
+    except (KeyError, ValueError):
+        return None
+    return lat, lon, radius
+
+@app.route('/api/hospitals/stream')
+def hospitals_stream():
+    """
+    Server-sent events: one `data:` event (a JSON list of hospitals) per
+    batch as they arrive, then `event: done` with {"count", "partial", "map"}.
+    "map" is the server-rendered map URL unless MAP_RENDER is "client".
+    """
+    area = _search_area()
+    if area is None:
+        return jsonify({"error": "lat and lon are required"}), 400
+    lat, lon, radius = area
+    zip_code = request.args.get("zip", "")
+    country = request.args.get("country", "")
+
+    def events():
+        found = []
+        report = {}
+        try:
+            for batch in iter_hospitals(lat, lon, radius, report=report):
+                if batch:
+                    found.extend(batch)
+                    yield f"data: {json.dumps(batch)}\n\n"
+            map_url = None
+            if MAP_RENDER != "client":
+                key = create_map(lat, lon, found, zip_code, country, radius=radius)
+                map_url = url_for('rendered_map', key=key) if key else None
+            done = {"count": len(found), "partial": report.get("partial", False), "map": map_url}
+            yield f"event: done\ndata: {json.dumps(done)}\n\n"
+        except Exception as e:
+            print(f"[ERROR] Streaming hospitals failed: {e}")
+            yield "event: error\ndata: {}\n\n"
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.route('/api/hospitals')
+def hospitals_api():
+    """
+    Compact JSON for client-side map rendering:
+    {"center": [lat, lon], "radius": meters, "hospitals": [{"name", "lat", "lon"}, ...]}
+    """
+    area = _search_area()
+    if area is None:
+        return jsonify({"error": "lat and lon are required"}), 400
+    lat, lon, radius = area
+    hospitals = get_hospitals(lat, lon, radius=radius)
+    return jsonify({"center": [lat, lon], "radius": radius, "hospitals": hospitals})
+
+@app.route('/map/<key>')
+def rendered_map(key):
+    if not key.isalnum():
+        return "Not found", 404
+    return send_from_directory(MAP_DIR, f"{key}.html")
+
 # -----------------------------------------------
 # Dynamic content routes
 # -----------------------------------------------
 @app.route("/get_content/<category>", methods=["POST"])
 def get_content(category):
     if category == "food":
-        return jsonify({"content": generate_food_exercise()})
+        return _content_response({"content": generate_food_exercise()}, ["food"])
     elif category == "routine":
-        return jsonify({"content": generate_routine()})
+        return _content_response({"content": generate_routine()}, ["routine"])
     elif category == "important":
-        return jsonify({"content": generate_important()})
+        return _content_response({"content": generate_important()}, ["important"])
+    elif category == "all":
+        return _content_response(generate_bundle(), ["food", "routine", "important"])
     else:
         return jsonify({"content": "No content available."})
 
+def _content_response(payload, categories):
+    """
+    JSON answer with a strong ETag: the answers' cache keys plus a hash of
+    the body (an evicted answer can come back different under the same key).
+    """
+    profile = read_profile()
+    response = jsonify(payload)
+    keys = [clean_key(cache_key(c, profile)) for c in categories]
+    response.set_etag(f"{make_key(*keys)[:24]}-{hash_text(response.get_data(as_text=True))}")
+    return response
+
+@app.route("/stream_content/<category>", methods=["POST"])
+def stream_content_route(category):
+    """
+    Same content as /get_content, sent as server-sent events while the model
+    is still generating. Each `data:` line is a JSON-encoded HTML chunk.
+    """
+    if category not in ("food", "routine", "important"):
+        return jsonify({"content": "No content available."}), 404
+    profile = read_profile()
+    chunks = stream_content(category, profile)
+    # Run up to the model slot before answering, so a saturated model is a
+    # 429/503 with Retry-After (see overloaded()) and not an error event
+    first = next(chunks, "")
+
+    def events():
+        sanitizer = Sanitizer(category)
+        try:
+            for chunk in itertools.chain([first], chunks):
+                text = sanitizer.feed(chunk)
+                if text:
+                    yield f"data: {json.dumps(text)}\n\n"
+            text = sanitizer.close()
+            if text:
+                yield f"data: {json.dumps(text)}\n\n"
+            yield "event: done\ndata: {}\n\n"
+        except Exception as e:
+            print(f"[ERROR] Streaming {category} failed: {e}")
+            yield "event: error\ndata: {}\n\n"
+
+    return Response(events(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route("/cache/stats")
+def cache_stats():
+    return jsonify({**response_cache.stats(), "llm": llm_gate.stats(), "singleflight": inflight.stats(), "http": http.stats(), "precomputed": precomputed.stats()})
+
 # -----------------------------------------------
 # Run app
 # -----------------------------------------------
@@ -0,0 +1,185 @@
+"""
+Responsive, fingerprinted image assets.
+
+Build step (run after changing anything in static/, and on deploy):
+
+    python assets.py build
+
+For every large JPEG/PNG under static/ this writes resized WebP and AVIF
+variants plus a fingerprinted copy of the original into static/build/, and
+records them in static/build/manifest.json. The favicon is re-encoded at
+small sizes. Templates use the `asset_url()`, `srcset()` and `picture()`
+helpers; without a manifest they fall back to the plain static files.
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+
+from flask import send_from_directory, url_for
+from markupsafe import Markup, escape
+
+STATIC_DIR = "static"
+BUILD_DIR = os.path.join(STATIC_DIR, "build")
+MANIFEST_PATH = os.path.join(BUILD_DIR, "manifest.json")
+
+WIDTHS = (480, 960, 1440, 1920)
+FORMATS = {"webp": {"quality": 80, "method": 6}, "avif": {"quality": 55, "speed": 8}}
+MIN_BYTES = 50 * 1024  # smaller images are served as they are
+ICON_SIZES = [(16, 16), (32, 32), (48, 48), (64, 64)]
+ONE_YEAR = 365 * 86400
+
+
+# ───────────────────────────────────────────────
+# Build step
+# ───────────────────────────────────────────────
+def _fingerprint(data):
+    return hashlib.sha256(data).hexdigest()[:10]
+
+
+def _write(relative_stem, ext, data):
+    """Write `data` as <stem>.<hash>.<ext> under the build dir and return its relative path."""
+    relative = f"{relative_stem}.{_fingerprint(data)}.{ext}"
+    path = os.path.join(BUILD_DIR, relative)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if not os.path.exists(path):
+        with open(path, "wb") as f:
+            f.write(data)
+    return relative
+
+
+def _encode(image, fmt, **options):
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt.upper(), **options)
+    return buffer.getvalue()
+
+
+def _build_image(relative, source, Image):
+    stem, ext = os.path.splitext(relative)
+    entry = {"source_hash": _fingerprint(source), "original": _write(stem, ext.lstrip(".").lower(), source), "variants": {}}
+    with Image.open(io.BytesIO(source)) as image:
+        image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+        entry["width"] = image.width
+        widths = [w for w in WIDTHS if w < image.width] + [image.width]
+        for fmt, options in FORMATS.items():
+            variants = {}
+            for width in sorted(set(widths)):
+                height = round(image.height * width / image.width)
+                resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+                try:
+                    variants[str(width)] = _write(f"{stem}.{width}", fmt, _encode(resized, fmt, **options))
+                except (KeyError, OSError, ValueError) as e:
+                    print(f"⚠️ Skipping {fmt} for {relative}: {e}")
+                    break
+            if variants:
+                entry["variants"][fmt] = variants
+    return entry
+
+
+def _build_icon(relative, source, Image):
+    stem, ext = os.path.splitext(relative)
+    with Image.open(io.BytesIO(source)) as image:
+        data = _encode(image.convert("RGBA"), "ico", sizes=ICON_SIZES)
+    return {"source_hash": _fingerprint(source), "original": _write(stem, "ico", data), "variants": {}}
+
+
+def build(static_dir=STATIC_DIR):
+    from PIL import Image
+
+    previous = load_manifest()
+    manifest = {}
+    for folder, dirs, files in os.walk(static_dir):
+        dirs[:] = [d for d in dirs if os.path.join(folder, d) not in (BUILD_DIR, os.path.join(static_dir, "maps"))]
+        for name in sorted(files):
+            ext = os.path.splitext(name)[1].lower()
+            if ext not in (".jpg", ".jpeg", ".png", ".ico"):
+                continue
+            path = os.path.join(folder, name)
+            if os.path.getsize(path) < MIN_BYTES:
+                continue
+            relative = os.path.relpath(path, static_dir).replace(os.sep, "/")
+            with open(path, "rb") as f:
+                source = f.read()
+
+            old = previous.get(relative)
+            if old and old["source_hash"] == _fingerprint(source) and os.path.exists(os.path.join(BUILD_DIR, old["original"])):
+                manifest[relative] = old
+                continue
+            try:
+                manifest[relative] = (_build_icon if ext == ".ico" else _build_image)(relative, source, Image)
+                print(f"✅ {relative}")
+            except Exception as e:
+                print(f"[ERROR] Failed to process {relative}: {e}")
+
+    os.makedirs(BUILD_DIR, exist_ok=True)
+    with open(MANIFEST_PATH, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    print(f"✅ Manifest written with {len(manifest)} assets")
+    return manifest
+
+
+# ───────────────────────────────────────────────
+# Flask integration
+# ───────────────────────────────────────────────
+def load_manifest(path=MANIFEST_PATH):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def init_assets(app):
+    """Register the /assets route and the asset_url/srcset/picture template helpers."""
+    manifest = load_manifest()
+
+    def _url(relative):
+        return url_for("built_asset", filename=relative)
+
+    def asset_url(filename, width=None, fmt="webp"):
+        """Fingerprinted URL for a static file; with `width`, the smallest variant at least that wide."""
+        entry = manifest.get(filename)
+        if not entry:
+            return url_for("static", filename=filename)
+        variants = entry["variants"].get(fmt)
+        if width is None or not variants:
+            return _url(entry["original"])
+        widths = sorted(int(w) for w in variants)
+        chosen = next((w for w in widths if w >= width), widths[-1])
+        return _url(variants[str(chosen)])
+
+    def srcset(filename, fmt="webp"):
+        entry = manifest.get(filename)
+        variants = entry["variants"].get(fmt) if entry else None
+        if not variants:
+            return ""
+        return ", ".join(f"{_url(path)} {width}w" for width, path in sorted(variants.items(), key=lambda v: int(v[0])))
+
+    def picture(filename, sizes="100vw", **attrs):
+        """<picture> with AVIF and WebP sources and the original as fallback."""
+        img_attrs = "".join(f' {escape(k.rstrip("_"))}="{escape(v)}"' for k, v in attrs.items())
+        sources = "".join(
+            f'<source type="image/{fmt}" srcset="{escape(srcset(filename, fmt))}" sizes="{escape(sizes)}">'
+            for fmt in ("avif", "webp")
+            if srcset(filename, fmt)
+        )
+        return Markup(f'<picture>{sources}<img src="{escape(asset_url(filename))}"{img_attrs}></picture>')
+
+    @app.route("/assets/<path:filename>", endpoint="built_asset")
+    def built_asset(filename):
+        # Names contain a content hash, so they can be cached forever
+        response = send_from_directory(BUILD_DIR, filename, max_age=ONE_YEAR)
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+    app.jinja_env.globals.update(asset_url=asset_url, srcset=srcset, picture=picture)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build responsive, fingerprinted image assets.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("build", help="generate static/build/ and its manifest")
+    args = parser.parse_args()
+    build()
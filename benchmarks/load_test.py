@@ -0,0 +1,341 @@
+"""
+Offline load test for the main routes.
+
+Drives the real Flask routes (/get_content/<category>, /search_location,
+/api/hospitals/stream, /base) through the WSGI test client under concurrency, with local stand-ins
+for Vertex AI, Google Geocoding and Overpass. Latency and failure rates of
+the stand-ins are configurable, so no network access or API keys are needed.
+
+    python benchmarks/load_test.py --requests 200 --concurrency 16
+    python benchmarks/load_test.py --llm-latency 1.5 --overpass-failure-rate 0.2
+    python benchmarks/load_test.py --save-baseline benchmarks/baseline.json
+    python benchmarks/load_test.py --compare benchmarks/baseline.json --tolerance 0.25
+"""
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import random
+import re
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FAKE_FRAGMENT = """<section class="recommendation-section">
+  <div class="recommendation-card">
+    <h3 class="category-title">🥗 Food</h3>
+    <ul class="recommendation-list">
+      <li><span class="material-symbols-outlined">restaurant</span> Grilled salmon with vegetables</li>
+      <li><span class="material-symbols-outlined">local_drink</span> Drink at least 2 liters of water daily</li>
+    </ul>
+  </div>
+</section>"""
+
+
+class InjectedFailure(Exception):
+    pass
+
+
+# ───────────────────────────────────────────────
+# Stand-ins for the upstream services
+# ───────────────────────────────────────────────
+def make_fake_llm(latency, jitter, failure_rate, chunks=20):
+    """A LangChain LLM that sleeps instead of calling Vertex and may fail on purpose."""
+    from langchain_core.language_models.llms import LLM
+    from langchain_core.outputs import GenerationChunk
+
+    class FakeVertex(LLM):
+        @property
+        def _llm_type(self):
+            return "fake-vertex"
+
+        def _delay(self):
+            if random.random() < failure_rate:
+                raise InjectedFailure("injected LLM failure")
+            return max(0.0, random.gauss(latency, jitter))
+
+        def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+            time.sleep(self._delay())
+            return f"```html\n{FAKE_FRAGMENT}\n```"
+
+        def _stream(self, prompt, stop=None, run_manager=None, **kwargs):
+            delay = self._delay() / chunks
+            text = f"```html\n{FAKE_FRAGMENT}\n```"
+            size = max(1, len(text) // chunks)
+            for i in range(0, len(text), size):
+                time.sleep(delay)
+                yield GenerationChunk(text=text[i:i + size])
+
+    return FakeVertex()
+
+
+def start_fake_http(geocode_latency, overpass_latency, overpass_failure_rate, hospitals_per_query):
+    """Serve /geocode/json and /interpreter on localhost; returns (server, base_url)."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            if url.path == "/geocode/json":
+                time.sleep(geocode_latency)
+                address = query.get("address", [""])[0]
+                seed = int(hashlib.sha1(address.encode("utf-8")).hexdigest()[:8], 16)
+                lat = 40.5 + (seed % 1000) / 2500
+                lon = -74.2 + (seed // 1000 % 1000) / 2500
+                self._send(200, {"status": "OK", "results": [{"geometry": {"location": {"lat": lat, "lng": lon}}}]})
+            elif url.path == "/interpreter":
+                time.sleep(overpass_latency)
+                if random.random() < overpass_failure_rate:
+                    self._send(504, {"error": "injected timeout"})
+                    return
+                self._send(200, {"elements": _fake_hospitals(query.get("data", [""])[0], hospitals_per_query)})
+            else:
+                self._send(404, {})
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def _fake_hospitals(query, count):
+    """Deterministic hospitals inside the query's bbox or around: area."""
+    numbers = [float(n) for n in re.findall(r"-?\d+\.\d+", query)]
+    if "around:" in query and len(numbers) >= 2:
+        lat, lon = numbers[-2], numbers[-1]
+        south, west, north, east = lat - 0.07, lon - 0.09, lat + 0.07, lon + 0.09
+    elif len(numbers) >= 4:
+        south, west, north, east = numbers[-4:]
+    else:
+        return []
+    rng = random.Random(query)
+    return [
+        {
+            "type": "node",
+            "id": i,
+            "lat": rng.uniform(south, north),
+            "lon": rng.uniform(west, east),
+            "tags": {"name": f"Hospital {i}"},
+        }
+        for i in range(count)
+    ]
+
+
+# ───────────────────────────────────────────────
+# Scenarios
+# ───────────────────────────────────────────────
+DISEASES = ["Diabetes", "Hypertension", "Obesity", "Heart disease", "Influenza", "Tuberculosis"]
+
+
+def _profile(rng, unique_profiles):
+    n = rng.randrange(unique_profiles)
+    prng = random.Random(n)
+    return {
+        "name": f"User {n}",
+        "age": str(prng.randint(18, 85)),
+        "weight": str(prng.randint(45, 120)),
+        "height": str(prng.randint(150, 195)),
+        "sex": prng.choice(["Male", "Female"]),
+        "race": prng.choice(["Asian", "White", "Black or African American", "Hispanic or Latino"]),
+        "disease": prng.sample(DISEASES, prng.randint(1, 2)),
+    }
+
+
+def route_get_content(client, rng, args):
+    category = rng.choice(["food", "routine", "important"])
+    return client.post(f"/get_content/{category}", data=_profile(rng, args.unique_profiles))
+
+
+def route_search_location(client, rng, args):
+    zip_code = str(10000 + rng.randrange(args.unique_locations))
+    return client.post("/search_location", data={"zip": zip_code, "country": "United States"})
+
+
+def route_hospitals_stream(client, rng, args):
+    zip_code = str(10000 + rng.randrange(args.unique_locations))
+    seed = int(hashlib.sha1(f"{zip_code}, United States".encode("utf-8")).hexdigest()[:8], 16)
+    lat = 40.5 + (seed % 1000) / 2500
+    lon = -74.2 + (seed // 1000 % 1000) / 2500
+    return client.get(
+        "/api/hospitals/stream",
+        query_string={"lat": lat, "lon": lon, "radius": 8000, "zip": zip_code, "country": "United States"},
+    )
+
+
+def route_base(client, rng, args):
+    return client.post("/base", data=_profile(rng, args.unique_profiles))
+
+
+ROUTES = {
+    "get_content": route_get_content,
+    "search_location": route_search_location,
+    "hospitals_stream": route_hospitals_stream,
+    "base": route_base,
+}
+
+
+def run_route(app, name, args):
+    rng = random.Random(args.seed)
+    seeds = [rng.random() for _ in range(args.requests)]
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def one(seed):
+        nonlocal errors
+        client = app.test_client()
+        start = time.perf_counter()
+        try:
+            response = ROUTES[name](client, random.Random(seed), args)
+            response.get_data()
+            ok = response.status_code < 500
+        except Exception:
+            ok = False
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            if not ok:
+                errors += 1
+
+    tracemalloc.start()
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(one, seeds))
+    wall = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    latencies.sort()
+    quantiles = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / wall, 2),
+        "p50_ms": round(quantiles[49] * 1000, 2),
+        "p95_ms": round(quantiles[94] * 1000, 2),
+        "p99_ms": round(quantiles[98] * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2),
+        "peak_traced_kb": round(peak / 1024, 1),
+        "max_rss_growth_kb": rss_after - rss_before,
+    }
+
+
+# ───────────────────────────────────────────────
+# Baselines
+# ───────────────────────────────────────────────
+def compare(results, baseline, tolerance):
+    """Return a list of regressions (p95 latency up or throughput down by more than `tolerance`)."""
+    regressions = []
+    for route, current in results.items():
+        before = baseline.get("routes", {}).get(route)
+        if not before:
+            continue
+        if before["p95_ms"] and current["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{route}: p95 {before['p95_ms']} -> {current['p95_ms']} ms")
+        if before["throughput_rps"] and current["throughput_rps"] < before["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{route}: throughput {before['throughput_rps']} -> {current['throughput_rps']} req/s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--routes", default=",".join(ROUTES), help="comma-separated subset of: " + ", ".join(ROUTES))
+    parser.add_argument("--requests", type=int, default=200, help="requests per route")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--unique-profiles", type=int, default=50, help="distinct patient profiles (controls cache hit rate)")
+    parser.add_argument("--unique-locations", type=int, default=30, help="distinct postal codes")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="seconds per fake model call")
+    parser.add_argument("--llm-jitter", type=float, default=0.2)
+    parser.add_argument("--llm-failure-rate", type=float, default=0.0)
+    parser.add_argument("--geocode-latency", type=float, default=0.15)
+    parser.add_argument("--overpass-latency", type=float, default=1.0)
+    parser.add_argument("--overpass-failure-rate", type=float, default=0.0)
+    parser.add_argument("--hospitals", type=int, default=40, help="hospitals returned per Overpass query")
+    parser.add_argument("--save-baseline", metavar="PATH")
+    parser.add_argument("--compare", metavar="PATH")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--verbose", action="store_true", help="keep the app's own log output")
+    args = parser.parse_args()
+
+    server, base_url = start_fake_http(args.geocode_latency, args.overpass_latency, args.overpass_failure_rate, args.hospitals)
+    workdir = tempfile.mkdtemp(prefix="livehealthy-bench-")
+    # Everything stateful goes to a scratch directory; configuration is read at import time
+    os.environ.update({
+        "GEOCODE_URL": f"{base_url}/geocode/json",
+        "OVERPASS_URL": f"{base_url}/interpreter",
+        "GOOGLE_API_KEY": "offline-benchmark",
+        "CACHE_DB": "",
+        "GEOCODE_CACHE_DB": "",
+        "TILE_CACHE_DB": "",
+        "USER_DB": os.path.join(workdir, "users.sqlite3"),
+        "WARM_UP": "0",
+    })
+    os.chdir(ROOT)
+    sys.path.insert(0, ROOT)
+    import app as app_module
+    import map as map_module
+    import prompt
+
+    prompt.set_llm(make_fake_llm(args.llm_latency, args.llm_jitter, args.llm_failure_rate))
+    map_module.MAP_DIR = os.path.join(workdir, "maps")
+    app_module.MAP_DIR = map_module.MAP_DIR
+
+    results = {}
+    for name in [r.strip() for r in args.routes.split(",") if r.strip()]:
+        if args.verbose:
+            results[name] = run_route(app_module.app, name, args)
+        else:
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+                results[name] = run_route(app_module.app, name, args)
+        r = results[name]
+        print(
+            f"{name:16} {r['requests']:5} req  {r['errors']:3} err  {r['throughput_rps']:8.2f} req/s  "
+            f"p50 {r['p50_ms']:8.1f}  p95 {r['p95_ms']:8.1f}  p99 {r['p99_ms']:8.1f} ms  "
+            f"peak {r['peak_traced_kb']:9.1f} KB"
+        )
+    # Let background Overpass work (prefetch, queries past the deadline) finish before the stub goes away
+    map_module._prefetch_pool.shutdown(wait=True)
+    map_module._overpass_pool.shutdown(wait=True)
+    server.shutdown()
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "routes": results}, f, indent=2, sort_keys=True)
+        print(f"✅ Baseline saved to {args.save_baseline}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("❌ Regressions:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("✅ No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
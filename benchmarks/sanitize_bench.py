@@ -0,0 +1,80 @@
+"""
+Microbenchmark for sanitize.py.
+
+Times sanitize() on whole fragments and the streaming Sanitizer on the same
+fragments fed in small chunks (as the SSE route does), for fragments from a
+typical answer up to a pathological one:
+
+    python benchmarks/sanitize_bench.py
+    python benchmarks/sanitize_bench.py --chunk 16 --min-seconds 1
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sanitize import Sanitizer, sanitize  # noqa: E402
+
+ITEM = (
+    '      <li><span class="material-symbols-outlined">restaurant</span> '
+    'Grilled salmon with <strong>steamed vegetables</strong> <!-- note --></li>\n'
+)
+NOISE = '      <li style="color:red" onclick="x()"><img src=x> Extra item <script>alert(1)</script></li>\n'
+
+
+def food_fragment(items):
+    """A food answer with `items` list entries per card (plus some markup that gets removed)."""
+    body = (ITEM + NOISE) * (items // 2) + ITEM * (items % 2)
+    card = (
+        '  <div class="recommendation-card">\n'
+        '    <h3 class="category-title">🥗 Food</h3>\n'
+        f'    <ul class="recommendation-list">\n{body}    </ul>\n'
+        "  </div>\n"
+    )
+    return f'```html\n<section class="recommendation-section">\n{card}{card}</section>\n```'
+
+
+def measure(fn, min_seconds):
+    runs = 0
+    start = time.perf_counter()
+    while True:
+        fn()
+        runs += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            return elapsed / runs
+
+
+def streamed(fragment, chunk):
+    sanitizer = Sanitizer("food")
+    parts = [sanitizer.feed(fragment[i:i + chunk]) for i in range(0, len(fragment), chunk)]
+    parts.append(sanitizer.close())
+    return "".join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="*", default=[5, 20, 100, 1000], help="list items per card")
+    parser.add_argument("--chunk", type=int, default=24, help="characters per streamed chunk")
+    parser.add_argument("--min-seconds", type=float, default=0.5, help="time spent on each measurement")
+    args = parser.parse_args()
+
+    print(f"{'items':>6} {'input':>9} {'output':>8} {'whole':>10} {'streamed':>10} {'MB/s':>7}")
+    for items in args.sizes:
+        fragment = food_fragment(items)
+        cleaned = sanitize("food", fragment)
+        assert streamed(fragment, args.chunk) == cleaned
+        whole = measure(lambda: sanitize("food", fragment), args.min_seconds)
+        stream = measure(lambda: streamed(fragment, args.chunk), args.min_seconds)
+        size = len(fragment.encode("utf-8"))
+        print(
+            f"{items:>6} {size:>8}B {len(cleaned.encode('utf-8')):>7}B "
+            f"{whole * 1e6:>8.1f}µs {stream * 1e6:>8.1f}µs {size / whole / 1e6:>7.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Process startup benchmark.
+
+Measures, in fresh interpreters, how long it takes to import the app and to
+serve the first `/` request, plus the slowest imports reported by
+`python -X importtime`. Run from the project root:
+
+    python benchmarks/startup.py --runs 5
+    python benchmarks/startup.py --runs 5 --max-import-ms 1500   # fail on regression
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+client = app.app.test_client()
+status = client.get("/").status_code
+t2 = time.perf_counter()
+print(json.dumps({"import_ms": (t1 - t0) * 1000, "first_request_ms": (t2 - t1) * 1000, "status": status}))
+"""
+
+
+def _env():
+    env = dict(os.environ)
+    env["WARM_UP"] = "0"  # measure startup itself, not the background warm-up
+    env.setdefault("PYTHONDONTWRITEBYTECODE", "1")
+    return env
+
+
+def measure_once():
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=ROOT, env=_env(), capture_output=True, text=True, check=True
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(limit=15):
+    """Top modules by cumulative import time, from -X importtime."""
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"], cwd=ROOT, env=_env(), capture_output=True, text=True
+    )
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us), int(self_us), name))
+    rows.sort(reverse=True)
+    return [{"module": name.strip(), "cumulative_ms": c / 1000, "self_ms": s / 1000} for c, s, name in rows[:limit]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-import-ms", type=float, help="exit with an error if the median import time is above this")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    samples = [measure_once() for _ in range(args.runs)]
+    result = {
+        "runs": args.runs,
+        "import_ms": statistics.median(s["import_ms"] for s in samples),
+        "first_request_ms": statistics.median(s["first_request_ms"] for s in samples),
+        "slowest_imports": slowest_imports(),
+    }
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"import app (median of {args.runs}): {result['import_ms']:.1f} ms")
+        print(f"first / request:              {result['first_request_ms']:.1f} ms")
+        print("slowest imports (cumulative):")
+        for row in result["slowest_imports"]:
+            print(f"  {row['cumulative_ms']:8.1f} ms  {row['module']}")
+
+    if args.max_import_ms is not None and result["import_ms"] > args.max_import_ms:
+        print(f"❌ import time {result['import_ms']:.1f} ms is above {args.max_import_ms} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
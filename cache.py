@@ -0,0 +1,194 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+# ───────────────────────────────────────────────
+# Key helpers
+# ───────────────────────────────────────────────
+def hash_text(text):
+    """Short, stable fingerprint of a string (used for prompt templates)."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def make_key(*parts):
+    """Build a cache key from JSON-serializable parts."""
+    payload = json.dumps(parts, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# ───────────────────────────────────────────────
+# Two-tier cache: in-process LRU + optional SQLite
+# ───────────────────────────────────────────────
+class ResponseCache:
+    """
+    LRU cache for JSON-serializable values with a TTL.
+
+    If `db_path` is given, entries are also written to a SQLite file so they
+    survive restarts and are shared between worker processes. The disk tier
+    is bounded by `max_disk_entries` (least recently used rows are dropped).
+
+    Expired entries are kept for another `keep_stale` seconds, during which
+    `get_stale()` still returns them (a fallback while an upstream is down).
+
+    The memory tier and the SQLite connection have separate locks, so memory
+    hits never wait on disk I/O. A disk hit refreshes the row's access time
+    at most every TOUCH_INTERVAL seconds.
+    """
+
+    TOUCH_INTERVAL = 300
+
+    def __init__(self, max_entries=256, ttl=86400, db_path=None, max_disk_entries=10000, keep_stale=0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.keep_stale = keep_stale
+        self.db_path = db_path
+        self.max_disk_entries = max_disk_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._db = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._writes = 0
+        if db_path:
+            self._open_db()
+
+    def _open_db(self):
+        folder = os.path.dirname(self.db_path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache(accessed_at)")
+        self._db.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return value
+                if expires_at + self.keep_stale <= now:
+                    del self._memory[key]
+
+        if self._db is not None:
+            with self._db_lock:
+                row = self._db.execute(
+                    "SELECT value, expires_at, accessed_at FROM cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and row[1] > now and row[2] < now - self.TOUCH_INTERVAL:
+                    self._db.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+                    self._db.commit()
+            if row is not None and row[1] > now:
+                value = json.loads(row[0])
+                with self._lock:
+                    self._remember(key, row[1], value)
+                    self.hits += 1
+                    self.disk_hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def get_stale(self, key):
+        """The value for `key` even if it has expired (within `keep_stale`), or None."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[0] + self.keep_stale > now:
+                return entry[1]
+        if self._db is not None:
+            with self._db_lock:
+                row = self._db.execute(
+                    "SELECT value FROM cache WHERE key = ? AND expires_at > ?", (key, now - self.keep_stale)
+                ).fetchone()
+            if row is not None:
+                return json.loads(row[0])
+        return None
+
+    def has(self, key):
+        """True if `key` holds a live entry (does not touch the hit/miss counters)."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[0] > now:
+                return True
+        if self._db is not None:
+            with self._db_lock:
+                row = self._db.execute(
+                    "SELECT 1 FROM cache WHERE key = ? AND expires_at > ?", (key, now)
+                ).fetchone()
+            return row is not None
+        return False
+
+    def set(self, key, value, ttl=None):
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._remember(key, expires_at, value)
+        if self._db is not None:
+            payload = json.dumps(value)
+            with self._db_lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, payload, expires_at, now),
+                )
+                # Eviction scans the table, so only run it every so often
+                self._writes += 1
+                if self._writes % 64 == 1:
+                    self._evict_disk(now)
+                self._db.commit()
+
+    def _remember(self, key, expires_at, value):
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self, now):
+        self._db.execute("DELETE FROM cache WHERE expires_at <= ?", (now - self.keep_stale,))
+        (count,) = self._db.execute("SELECT COUNT(*) FROM cache").fetchone()
+        overflow = count - self.max_disk_entries
+        if overflow > 0:
+            self._db.execute(
+                "DELETE FROM cache WHERE key IN ("
+                " SELECT key FROM cache ORDER BY accessed_at ASC LIMIT ?)",
+                (overflow,),
+            )
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM cache")
+                self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+            }
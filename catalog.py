@@ -0,0 +1,82 @@
+import csv
+import difflib
+import os
+import re
+import threading
+import time
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def normalize_name(name):
+    """'Crohn's  Disease' -> 'crohn s disease' (case, punctuation and spacing ignored)."""
+    return _NON_ALNUM.sub(" ", (name or "").casefold()).strip()
+
+
+# ───────────────────────────────────────────────
+# Disease catalog loaded from disease.csv
+# ───────────────────────────────────────────────
+class DiseaseCatalog:
+    """
+    The diseases from a one-column CSV, loaded once into an immutable tuple
+    with a normalized lookup index. The file is re-read only when its mtime
+    changes (checked at most every `check_interval` seconds).
+    """
+
+    def __init__(self, path, check_interval=2.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked = float("-inf")
+        self._names = ()
+        self._index = {}
+        self._keys = ()
+        self._refresh()
+
+    def _refresh(self):
+        now = time.monotonic()
+        if now - self._checked < self.check_interval:
+            return
+        with self._lock:
+            self._checked = now
+            try:
+                mtime = os.path.getmtime(self.path)
+            except OSError:
+                return
+            if mtime == self._mtime:
+                return
+            names = []
+            with open(self.path, newline="") as csvfile:
+                for row in csv.reader(csvfile):
+                    if row and row[0].strip():
+                        names.append(row[0].strip())
+            index = {normalize_name(n): n for n in names}
+            self._names, self._index, self._keys = tuple(names), index, tuple(index)
+            self._mtime = mtime
+
+    @property
+    def names(self):
+        self._refresh()
+        return self._names
+
+    def canonical(self, name):
+        """The catalog spelling of `name`, or None if it is not a known disease."""
+        self._refresh()
+        return self._index.get(normalize_name(name))
+
+    def search(self, query, limit=10):
+        """Prefix matches (whole name, then any word); fuzzy matches only if there are none."""
+        self._refresh()
+        q = normalize_name(query)
+        if not q:
+            return list(self._names[:limit])
+        prefix = [self._index[k] for k in self._keys if k.startswith(q)]
+        words = [self._index[k] for k in self._keys if not k.startswith(q) and f" {q}" in f" {k}"]
+        results = prefix + words
+        if not results:
+            results = [self._index[k] for k in difflib.get_close_matches(q, self._keys, n=limit, cutoff=0.6)]
+        return results[:limit]
+
+
+disease_catalog = DiseaseCatalog("disease.csv")
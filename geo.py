@@ -0,0 +1,35 @@
+import math
+import os
+
+OVERPASS_URL = os.getenv("OVERPASS_URL", "https://overpass-api.de/api/interpreter")
+
+EARTH_RADIUS_M = 6371000.0
+METERS_PER_DEGREE = 111320.0
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """Great-circle distance in meters."""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def degree_span(lat, radius):
+    """(dlat, dlon) in degrees that cover `radius` meters around `lat`."""
+    dlat = radius / METERS_PER_DEGREE
+    dlon = radius / (METERS_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01))
+    return dlat, dlon
+
+
+def parse_hospitals(elements):
+    """Turn Overpass elements into {"name", "lat", "lon"} dicts."""
+    hospitals = []
+    for e in elements:
+        name = e.get("tags", {}).get("name", "Unknown Hospital")
+        lat_ = e.get("lat", e.get("center", {}).get("lat"))
+        lon_ = e.get("lon", e.get("center", {}).get("lon"))
+        if lat_ and lon_:
+            hospitals.append({"name": name, "lat": lat_, "lon": lon_})
+    return hospitals
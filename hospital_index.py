@@ -0,0 +1,189 @@
+"""
+Local spatial index of hospitals, built from an Overpass JSON dump.
+
+Build or refresh the dump (run periodically, e.g. from cron):
+
+    python hospital_index.py refresh --bbox 40.4,-74.3,41.0,-73.6 --out data/hospitals.json
+    python hospital_index.py refresh --out data/hospitals.json --incremental
+
+Then set HOSPITAL_INDEX_PATH=data/hospitals.json. The app reloads the index
+when the file changes.
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from geo import EARTH_RADIUS_M, OVERPASS_URL, degree_span, parse_hospitals
+from http_client import http
+
+CELL_DEG = 0.1  # grid cell size (~11 km north-south)
+
+
+# ───────────────────────────────────────────────
+# Grid index on NumPy arrays
+# ───────────────────────────────────────────────
+class HospitalIndex:
+    """
+    Hospital points bucketed into a CELL_DEG grid. Points are stored sorted by
+    cell so each cell is a contiguous slice of the coordinate arrays; a radius
+    query only computes distances for the cells around the point.
+    """
+
+    def __init__(self, hospitals, bbox=None):
+        self.bbox = bbox  # (south, west, north, east) the dump was built for
+        lats = np.array([h["lat"] for h in hospitals], dtype=np.float64)
+        lons = np.array([h["lon"] for h in hospitals], dtype=np.float64)
+        rows = np.floor(lats / CELL_DEG).astype(np.int64)
+        cols = np.floor(lons / CELL_DEG).astype(np.int64)
+        order = np.lexsort((cols, rows))
+        self.lats = lats[order]
+        self.lons = lons[order]
+        self.names = [hospitals[i]["name"] for i in order]
+        self._cells = {}
+        rows, cols = rows[order], cols[order]
+        start = 0
+        for i in range(1, len(order) + 1):
+            if i == len(order) or rows[i] != rows[start] or cols[i] != cols[start]:
+                self._cells[(int(rows[start]), int(cols[start]))] = (start, i)
+                start = i
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def from_dump(cls, path):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        bbox = tuple(data["bbox"]) if data.get("bbox") else None
+        return cls(parse_hospitals(data.get("elements", [])), bbox=bbox)
+
+    def covers(self, lat, lon, radius):
+        if self.bbox is None:
+            return True
+        south, west, north, east = self.bbox
+        dlat, dlon = degree_span(lat, radius)
+        return south <= lat - dlat and lat + dlat <= north and west <= lon - dlon and lon + dlon <= east
+
+    def query(self, lat, lon, radius):
+        """Hospitals within `radius` meters, nearest first."""
+        dlat, dlon = degree_span(lat, radius)
+        row_lo, row_hi = int(np.floor((lat - dlat) / CELL_DEG)), int(np.floor((lat + dlat) / CELL_DEG))
+        col_lo, col_hi = int(np.floor((lon - dlon) / CELL_DEG)), int(np.floor((lon + dlon) / CELL_DEG))
+        slices = [
+            np.arange(*self._cells[(r, c)])
+            for r in range(row_lo, row_hi + 1)
+            for c in range(col_lo, col_hi + 1)
+            if (r, c) in self._cells
+        ]
+        if not slices:
+            return []
+        idx = np.concatenate(slices)
+        p1, p2 = np.radians(lat), np.radians(self.lats[idx])
+        dl = np.radians(self.lons[idx] - lon)
+        a = np.sin((p2 - p1) / 2) ** 2 + np.cos(p1) * np.cos(p2) * np.sin(dl / 2) ** 2
+        dist = 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+        keep = dist <= radius
+        idx, dist = idx[keep], dist[keep]
+        return [
+            {"name": self.names[i], "lat": float(self.lats[i]), "lon": float(self.lons[i])}
+            for i in idx[np.argsort(dist, kind="stable")]
+        ]
+
+
+# ───────────────────────────────────────────────
+# Loading with hot reload
+# ───────────────────────────────────────────────
+RELOAD_CHECK_SECONDS = 30
+
+_state = {"index": None, "mtime": None, "checked": 0.0}
+_lock = threading.Lock()
+
+
+def get_hospital_index():
+    """The index from HOSPITAL_INDEX_PATH (None if not configured), reloaded when the file changes."""
+    path = os.getenv("HOSPITAL_INDEX_PATH")
+    if not path:
+        return None
+    now = time.monotonic()
+    if _state["index"] is not None and now - _state["checked"] < RELOAD_CHECK_SECONDS:
+        return _state["index"]
+    with _lock:
+        _state["checked"] = now
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return _state["index"]
+        if mtime != _state["mtime"]:
+            try:
+                _state["index"] = HospitalIndex.from_dump(path)
+                _state["mtime"] = mtime
+                print(f"✅ Loaded {len(_state['index'])} hospitals from {path}")
+            except Exception as e:
+                print(f"[ERROR] Failed to load hospital index: {e}")
+    return _state["index"]
+
+
+# ───────────────────────────────────────────────
+# Refresh job
+# ───────────────────────────────────────────────
+def _fetch(bbox, newer=None):
+    south, west, north, east = bbox
+    since = f'(newer:"{newer}")' if newer else ""
+    query = f"""
+    [out:json][timeout:600];
+    nwr["amenity"="hospital"]{since}({south},{west},{north},{east});
+    out center;
+    """
+    response = http.post(OVERPASS_URL, data={"data": query}, timeout=(3.05, 660))
+    response.raise_for_status()
+    return response.json()
+
+
+def refresh_dump(out, bbox=None, incremental=False):
+    """
+    Download hospitals for `bbox` into `out`. With `incremental`, only
+    elements changed since the previous dump are fetched and merged in
+    (elements deleted upstream are only dropped by a full refresh).
+    """
+    previous = None
+    if os.path.exists(out):
+        with open(out, encoding="utf-8") as f:
+            previous = json.load(f)
+        bbox = bbox or tuple(previous["bbox"])
+    if bbox is None:
+        raise ValueError("A bounding box is required for the first refresh.")
+
+    newer = previous.get("osm3s", {}).get("timestamp_osm_base") if incremental and previous else None
+    data = _fetch(bbox, newer=newer)
+    if newer:
+        merged = {(e["type"], e["id"]): e for e in previous.get("elements", [])}
+        merged.update({(e["type"], e["id"]): e for e in data.get("elements", [])})
+        data["elements"] = list(merged.values())
+    data["bbox"] = list(bbox)
+
+    folder = os.path.dirname(out)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=folder or ".", suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, out)
+    print(f"✅ Wrote {len(data['elements'])} hospitals to {out}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the local hospital index dump.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    refresh = sub.add_parser("refresh", help="download or update the hospital dump")
+    refresh.add_argument("--out", default=os.getenv("HOSPITAL_INDEX_PATH", os.path.join("data", "hospitals.json")))
+    refresh.add_argument("--bbox", help="south,west,north,east (required for the first run)")
+    refresh.add_argument("--incremental", action="store_true", help="only fetch elements changed since the last dump")
+    args = parser.parse_args()
+
+    bbox = tuple(float(v) for v in args.bbox.split(",")) if args.bbox else None
+    refresh_dump(args.out, bbox=bbox, incremental=args.incremental)
@@ -0,0 +1,173 @@
+import os
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class CircuitOpen(requests.exceptions.RequestException):
+    """Raised instead of calling an upstream that has been failing."""
+
+
+# ───────────────────────────────────────────────
+# Circuit breaker (one per upstream host)
+# ───────────────────────────────────────────────
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures. While open, calls
+    fail immediately; after `reset_timeout` seconds one trial call is let
+    through, and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial_running or time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
+    @property
+    def is_open(self):
+        with self._lock:
+            return self._opened_at is not None
+
+
+# ───────────────────────────────────────────────
+# Pooled session with retries
+# ───────────────────────────────────────────────
+class HttpClient:
+    """
+    A shared requests.Session (keep-alive, at most `pool_size` connections
+    per host) with bounded retries on connection errors and 429/5xx, using
+    full-jitter exponential backoff (or the server's Retry-After when shorter
+    than `max_backoff`), and a circuit breaker per host.
+    """
+
+    def __init__(self, pool_size=10, max_retries=2, backoff=0.5, max_backoff=8.0,
+                 failure_threshold=5, reset_timeout=30.0):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=pool_size, pool_block=True, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._breakers = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.short_circuited = 0
+
+    def breaker(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            breaker = self._breakers.get(host)
+            if breaker is None:
+                breaker = self._breakers[host] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            return breaker
+
+    def _delay(self, attempt, response):
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit() and int(retry_after) <= self.max_backoff:
+            delay = max(delay, int(retry_after))
+        return delay
+
+    def request(self, method, url, retries=None, **kwargs):
+        """
+        Like requests.request. Returns the last response (the caller still
+        checks its status) or raises the last connection error / CircuitOpen.
+        Read timeouts are not retried: the upstream is already slow.
+        """
+        breaker = self.breaker(url)
+        if not breaker.allow():
+            with self._lock:
+                self.short_circuited += 1
+            raise CircuitOpen(f"{urlsplit(url).netloc} is failing; not calling it for now")
+
+        retries = self.max_retries if retries is None else retries
+        attempt = 0
+        while True:
+            with self._lock:
+                self.requests += 1
+            response = error = None
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.exceptions.RequestException as e:
+                error = e
+
+            # ConnectTimeout is a ConnectionError; ReadTimeout is not
+            retryable = (
+                response is not None and response.status_code in RETRY_STATUSES
+            ) or isinstance(error, requests.exceptions.ConnectionError)
+            if not retryable and error is None:
+                breaker.record_success()
+                return response
+            if not retryable or attempt >= retries:
+                breaker.record_failure()
+                with self._lock:
+                    self.failures += 1
+                if error is not None:
+                    raise error
+                return response
+
+            with self._lock:
+                self.retries += 1
+            time.sleep(self._delay(attempt, response))
+            attempt += 1
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def stats(self):
+        with self._lock:
+            breakers = list(self._breakers.values())
+            return {
+                "requests": self.requests,
+                "retries": self.retries,
+                "failures": self.failures,
+                "short_circuited": self.short_circuited,
+                "open_circuits": sum(1 for b in breakers if b.is_open),
+            }
+
+
+http = HttpClient(
+    pool_size=int(os.getenv("HTTP_POOL_SIZE", "10")),
+    max_retries=int(os.getenv("HTTP_MAX_RETRIES", "2")),
+    failure_threshold=int(os.getenv("HTTP_BREAKER_THRESHOLD", "5")),
+    reset_timeout=float(os.getenv("HTTP_BREAKER_RESET", "30")),
+)
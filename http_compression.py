@@ -0,0 +1,161 @@
+"""
+Response compression and validators.
+
+init_compression(app) compresses responses with zstd, brotli or gzip (the
+first one the client accepts, in that order) when they are large enough and
+of a text type. Streamed responses (server-sent events, CSV exports) are
+left alone. Bodies with a strong ETag are compressed once and kept in a
+small LRU, and the ETag gets the encoding appended so caches never mix the
+variants. GET requests carrying a matching If-None-Match get a 304.
+
+`etagged` marks views whose page is the same for everyone: their responses
+get an ETag from the rendered body, so browsers revalidate instead of
+downloading the page again.
+"""
+import functools
+import gzip
+import os
+import threading
+from collections import OrderedDict
+
+from flask import make_response, request
+
+COMPRESSIBLE_TYPES = frozenset({
+    "text/html", "text/plain", "text/css", "text/csv", "text/javascript",
+    "application/javascript", "application/json", "image/svg+xml",
+})
+MAX_FILE_BYTES = 8 * 1024 * 1024  # larger files are sent as they are
+
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+COMPRESS_CACHE_BYTES = int(os.getenv("COMPRESS_CACHE_BYTES", str(16 * 1024 * 1024)))
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    local = threading.local()  # compressor objects are not thread-safe
+
+    def compress(data):
+        compressor = getattr(local, "compressor", None)
+        if compressor is None:
+            compressor = local.compressor = zstandard.ZstdCompressor(level=3)
+        return compressor.compress(data)
+    return compress
+
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return lambda data: brotli.compress(data, quality=5)
+
+
+def available_encodings():
+    """{encoding: compress function} for the codecs installed here, in order of preference."""
+    encodings = OrderedDict()
+    for name, factory in (("zstd", _zstd), ("br", _brotli)):
+        compress = factory()
+        if compress is not None:
+            encodings[name] = compress
+    encodings["gzip"] = lambda data: gzip.compress(data, compresslevel=6, mtime=0)
+    return encodings
+
+
+class CompressedCache:
+    """Compressed bodies keyed by (ETag, encoding), bounded by total size."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+            return data
+
+    def set(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._items[key] = data
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self._bytes -= len(evicted)
+
+
+def _choose(encodings):
+    accepted = request.accept_encodings
+    for name in encodings:
+        if accepted.quality(name) > 0:
+            return name
+    return None
+
+
+def etagged(view):
+    """Give the page an ETag from its body (revalidated on every visit, 304 when unchanged)."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        response = make_response(view(*args, **kwargs))
+        if response.status_code == 200 and not response.is_streamed:
+            response.add_etag()
+            response.cache_control.no_cache = True
+            response = response.make_conditional(request)
+        return response
+    return wrapper
+
+
+def init_compression(app, min_size=COMPRESS_MIN_SIZE, cache_bytes=COMPRESS_CACHE_BYTES):
+    encodings = available_encodings()
+    cache = CompressedCache(cache_bytes)
+
+    @app.after_request
+    def _compress(response):
+        compressible = response.mimetype in COMPRESSIBLE_TYPES
+        if compressible:
+            response.vary.add("Accept-Encoding")
+        if (
+            compressible
+            and response.status_code == 200
+            and "Content-Encoding" not in response.headers
+            and not response.cache_control.no_transform
+        ):
+            if response.direct_passthrough:
+                # send_file(): small text files (the rendered maps) are read and compressed
+                if response.content_length is not None and response.content_length <= MAX_FILE_BYTES:
+                    response.direct_passthrough = False
+                    response.make_sequence()
+            if not response.is_streamed and (response.content_length or 0) >= min_size:
+                encoding = _choose(encodings)
+                if encoding is not None:
+                    _encode(response, encoding, encodings[encoding], cache)
+
+        if request.method in ("GET", "HEAD") and response.get_etag()[0]:
+            response = response.make_conditional(request)
+        return response
+
+    return encodings
+
+
+def _encode(response, encoding, compress, cache):
+    etag, weak = response.get_etag()
+    key = (etag, encoding) if etag and not weak else None
+    data = cache.get(key) if key else None
+    if data is None:
+        data = compress(response.get_data())
+        if key:
+            cache.set(key, data)
+    response.set_data(data)
+    response.headers["Content-Encoding"] = encoding
+    if etag:
+        response.set_etag(f"{etag}-{encoding}", weak=weak)
@@ -0,0 +1,82 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Overloaded(Exception):
+    """Raised when an LLM call cannot get a slot; carries the HTTP status to return."""
+
+    def __init__(self, message, status=503, retry_after=5):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+# ───────────────────────────────────────────────
+# Bounded concurrency gate for upstream calls
+# ───────────────────────────────────────────────
+class LLMGate:
+    """
+    Allow at most `max_in_flight` calls at once and at most `max_queue`
+    callers waiting for a slot. A caller that finds the queue full gets a
+    429 immediately; one that waits longer than `queue_timeout` gets a 503.
+    """
+
+    def __init__(self, max_in_flight=4, max_queue=16, queue_timeout=10.0):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def _enqueue(self):
+        with self._lock:
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                raise Overloaded("Too many requests are waiting for the model.", status=429)
+            self.waiting += 1
+
+    def _dequeue(self, acquired):
+        with self._lock:
+            self.waiting -= 1
+            if not acquired:
+                self.timed_out += 1
+        if not acquired:
+            raise Overloaded("Timed out waiting for the model.", status=503)
+
+    def _enter(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def _leave(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    @contextmanager
+    def slot(self):
+        if not self._slots.acquire(blocking=False):
+            self._enqueue()
+            acquired = False
+            try:
+                acquired = self._slots.acquire(timeout=self.queue_timeout)
+            finally:
+                self._dequeue(acquired)
+        self._enter()
+        try:
+            yield
+        finally:
+            self._leave()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": self.in_flight,
+                "waiting": self.waiting,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+            }
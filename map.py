@@ -1,16 +1,82 @@
+import hashlib
+import html
+import math
 import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FutureTimeout
 import requests
-import folium
 from dotenv import load_dotenv 
 load_dotenv()
+from cache import ResponseCache, make_key
+from http_client import CircuitOpen, http
+from metrics import timed
+from geo import OVERPASS_URL, degree_span, haversine_m, parse_hospitals
+from postal_index import get_postal_index, normalize_postal_code
 
 # ───────────────────────────────────────────────
 # 1. GOOGLE GEOCODING API  (replace Nominatim)
 # ───────────────────────────────────────────────
+GEOCODE_URL = os.getenv("GEOCODE_URL", "https://maps.googleapis.com/maps/api/geocode/json")
+
+# Postal codes almost never move, so results are kept for a long time.
+# Codes Google could not find are remembered for a shorter period.
+GEOCODE_TTL = int(os.getenv("GEOCODE_TTL", str(90 * 86400)))
+GEOCODE_NEGATIVE_TTL = int(os.getenv("GEOCODE_NEGATIVE_TTL", "86400"))
+
+geocode_cache = ResponseCache(
+    max_entries=2048,
+    ttl=GEOCODE_TTL,
+    db_path=os.getenv("GEOCODE_CACHE_DB", os.path.join("cache", "geocode.sqlite3")) or None,
+    max_disk_entries=200000,
+    keep_stale=365 * 86400,
+)
+
+
 def get_coordinates(postal_code, country):
     """
-    Convert a postal code into (latitude, longitude)
-    using Google Maps Geocoding API.
+    Convert a postal code into (latitude, longitude).
+    Tries the offline postal index, then the geocode cache, then the
+    Google Maps Geocoding API.
+    """
+    with timed("geocode"):
+        return _lookup_coordinates(postal_code, country)
+
+
+def _lookup_coordinates(postal_code, country):
+    index = get_postal_index()
+    if index is not None:
+        coords = index.lookup(postal_code, country)
+        if coords:
+            return coords
+
+    key = make_key("geocode", normalize_postal_code(postal_code), (country or "").strip().lower())
+    cached = geocode_cache.get(key)
+    if cached is not None:
+        if cached["found"]:
+            return cached["lat"], cached["lon"]
+        return None, None
+
+    with timed("geocode_google"):
+        lat, lon, status = _google_geocode(postal_code, country)
+    if status == "OK":
+        geocode_cache.set(key, {"found": True, "lat": lat, "lon": lon})
+    elif status == "ZERO_RESULTS":
+        geocode_cache.set(key, {"found": False}, ttl=GEOCODE_NEGATIVE_TTL)
+    elif status == "ERROR":
+        # Google is unreachable: an expired answer is better than none
+        stale = geocode_cache.get_stale(key)
+        if stale is not None and stale["found"]:
+            print(f"⚠️ Using a stale location for {postal_code}, {country}.")
+            return stale["lat"], stale["lon"]
+    return lat, lon
+
+
+def _google_geocode(postal_code, country):
+    """
+    Returns (lat, lon, status); status is the API status or "ERROR".
     """
     try:
         GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")  # store key in .env
@@ -18,9 +84,8 @@ def get_coordinates(postal_code, country):
             raise ValueError("Missing Google API key. Set GOOGLE_API_KEY in environment.")
 
         address = f"{postal_code}, {country}"
-        url = "https://maps.googleapis.com/maps/api/geocode/json"
         params = {"address": address, "key": GOOGLE_API_KEY}
-        response = requests.get(url, params=params, timeout=10)
+        response = http.get(GEOCODE_URL, params=params, timeout=(3.05, 10))
         response.raise_for_status()
         data = response.json()
 
@@ -28,81 +93,423 @@ def get_coordinates(postal_code, country):
             location = data["results"][0]["geometry"]["location"]
             lat, lon = location["lat"], location["lng"]
             print(f"✅ Coordinates found for {postal_code}, {country}: ({lat}, {lon})")
-            return lat, lon
+            return lat, lon, "OK"
         else:
             print(f"⚠️ Google API could not find coordinates: {data['status']}")
-            return None, None
+            return None, None, data["status"]
 
+    except CircuitOpen as e:
+        print(f"⚠️ Geocoding skipped: {e}")
+        return None, None, "ERROR"
     except Exception as e:
         print(f"[ERROR] Geocoding failed: {e}")
-        return None, None
+        return None, None, "ERROR"
 
 
 # ───────────────────────────────────────────────
 # 2. Retrieve nearby hospitals from OpenStreetMap
 # ───────────────────────────────────────────────
-def get_hospitals(lat, lon, radius=5000):
+# Hard limit on how long a search waits for Overpass. Queries still running
+# at the deadline finish in the background and fill the tile cache.
+SEARCH_DEADLINE = float(os.getenv("SEARCH_DEADLINE", "8"))
+# Query nodes, ways and relations separately (and concurrently), so the
+# fast node results can be shown before the slower way/relation ones.
+OVERPASS_SPLIT = os.getenv("OVERPASS_SPLIT", "0") == "1"
+
+
+def get_hospitals(lat, lon, radius=5000, deadline=None):
+    """
+    Hospitals within `radius` meters as {"name", "lat", "lon"} dicts, nearest first.
+    Whatever has arrived after `deadline` seconds (SEARCH_DEADLINE) is returned.
+    """
+    with timed("hospitals"):
+        hospitals = [h for batch in iter_hospitals(lat, lon, radius, deadline) for h in batch]
+    hospitals.sort(key=lambda h: haversine_m(lat, lon, h["lat"], h["lon"]))
+    print(f"✅ Found {len(hospitals)} hospitals nearby.")
+    return hospitals
+
+
+def iter_hospitals(lat, lon, radius=5000, deadline=None, report=None):
+    """
+    Yield lists of hospitals within `radius` as they become available: the
+    local index (HOSPITAL_INDEX_PATH) when it covers the area, otherwise
+    cached grid cells first and then each Overpass query as it completes.
+    If `report` is a dict, "partial" is set in it when the deadline cut the
+    search short or some cells could not be fetched.
+    """
+    report = report if report is not None else {}
+    report["partial"] = False
+    index = _local_index()
+    if index is not None and index.covers(lat, lon, radius):
+        with timed("hospital_index"):
+            yield index.query(lat, lon, radius)
+        return
+
+    def nearby(hospitals):
+        hospitals = [h for h in hospitals if haversine_m(lat, lon, h["lat"], h["lon"]) <= radius]
+        hospitals.sort(key=lambda h: haversine_m(lat, lon, h["lat"], h["lon"]))
+        return hospitals
+
+    cells = _cells_for(lat, lon, radius)
+    cached = []
+    missing = []
+    for cell in cells:
+        hospitals = tile_cache.get(_tile_key(cell))
+        if hospitals is None:
+            missing.append(cell)
+        else:
+            cached.extend(hospitals)
+    if cached:
+        yield nearby(cached)
+
+    ring = [cell for cell in _cells_for(lat, lon, radius, margin=1) if cell not in cells]
+    if not missing:
+        _prefetch(ring)
+        return
+
+    got_any = len(missing) < len(cells)
+    failed = False
+    wanted = set(missing)
+    seen = set()
+
+    def fresh(hospitals):
+        # The query bbox can span cached cells, whose hospitals were already yielded
+        out = []
+        for h in hospitals:
+            point = (h["lat"], h["lon"])
+            if point not in seen and _cell_of(*point) in wanted:
+                seen.add(point)
+                out.append(h)
+        return out
+
+    end = time.monotonic() + (SEARCH_DEADLINE if deadline is None else deadline)
+    try:
+        for future in as_completed(_start_fetch(missing), timeout=max(0.0, end - time.monotonic())):
+            hospitals = future.result()
+            if hospitals is None:
+                failed = True
+                continue
+            got_any = True
+            hospitals = fresh(hospitals)
+            if hospitals:
+                yield nearby(hospitals)
+    except FutureTimeout:
+        print("⚠️ Search deadline reached; returning partial results.")
+        report["partial"] = True
+    else:
+        # Only once the search's own queries are done, and not while Overpass is slow or failing
+        if not failed:
+            _prefetch(ring)
+
+    if failed:
+        # Overpass is failing: fall back to expired cells, then to the local index
+        stale = [tile_cache.get_stale(_tile_key(cell)) for cell in missing]
+        extra = fresh(h for hospitals in stale if hospitals for h in hospitals)
+        if extra:
+            got_any = True
+            yield nearby(extra)
+        report["partial"] = report["partial"] or None in stale
+    if not got_any and index is not None:
+        yield index.query(lat, lon, radius)
+
+
+def _local_index():
+    if not os.getenv("HOSPITAL_INDEX_PATH"):
+        return None
+    from hospital_index import get_hospital_index  # pulls in numpy, so only when configured
+    return get_hospital_index()
+
+
+# Overpass results are cached per TILE_DEG grid cell, so nearby searches
+# (different postal codes in the same area) reuse the same cells.
+TILE_DEG = float(os.getenv("TILE_DEG", "0.05"))
+TILE_TTL = int(os.getenv("TILE_TTL", str(7 * 86400)))
+TILE_STALE_TTL = int(os.getenv("TILE_STALE_TTL", str(30 * 86400)))  # expired cells usable while Overpass is down
+
+tile_cache = ResponseCache(
+    max_entries=4096,
+    ttl=TILE_TTL,
+    db_path=os.getenv("TILE_CACHE_DB", os.path.join("cache", "tiles.sqlite3")) or None,
+    max_disk_entries=100000,
+    keep_stale=TILE_STALE_TTL,
+)
+
+_overpass_pool = ThreadPoolExecutor(max_workers=int(os.getenv("OVERPASS_WORKERS", "6")))
+_pending = {}  # (bbox, kind) -> Future, so identical searches share one query
+_pending_lock = threading.Lock()
+_prefetch_pool = ThreadPoolExecutor(max_workers=2)
+_prefetching = set()
+_prefetch_lock = threading.Lock()
+
+
+def _cell_of(lat, lon):
+    return int(math.floor(lat / TILE_DEG)), int(math.floor(lon / TILE_DEG))
+
+
+def _cells_for(lat, lon, radius, margin=0):
+    dlat, dlon = degree_span(lat, radius)
+    row_lo, col_lo = _cell_of(lat - dlat, lon - dlon)
+    row_hi, col_hi = _cell_of(lat + dlat, lon + dlon)
+    return [
+        (r, c)
+        for r in range(row_lo - margin, row_hi + margin + 1)
+        for c in range(col_lo - margin, col_hi + margin + 1)
+    ]
+
+
+def _tile_key(cell):
+    return make_key("tile", TILE_DEG, cell)
+
+
+def _cell_range(cells):
+    """(bbox, every cell inside it) for the row/column range spanned by `cells`."""
+    rows = [r for r, _ in cells]
+    cols = [c for _, c in cells]
+    bbox = (min(rows) * TILE_DEG, min(cols) * TILE_DEG, (max(rows) + 1) * TILE_DEG, (max(cols) + 1) * TILE_DEG)
+    covered = [
+        (r, c)
+        for r in range(min(rows), max(rows) + 1)
+        for c in range(min(cols), max(cols) + 1)
+    ]
+    return bbox, covered
+
+
+def _query_overpass(bbox, kind="nwr"):
+    """Hospitals of one element type ("node", "way", "relation" or "nwr") in `bbox`, or None on failure."""
+    south, west, north, east = bbox
     try:
         query = f"""
         [out:json][timeout:25];
-        (
-          node["amenity"="hospital"](around:{radius},{lat},{lon});
-          way["amenity"="hospital"](around:{radius},{lat},{lon});
-          relation["amenity"="hospital"](around:{radius},{lat},{lon});
-        );
+        {kind}["amenity"="hospital"]({south},{west},{north},{east});
         out center;
         """
-        url = "https://overpass-api.de/api/interpreter"
-        response = requests.get(url, params={"data": query}, timeout=25)
-        response.raise_for_status()
-
-        data = response.json()
-        hospitals = []
-        for e in data.get("elements", []):
-            name = e.get("tags", {}).get("name", "Unknown Hospital")
-            lat_ = e.get("lat", e.get("center", {}).get("lat"))
-            lon_ = e.get("lon", e.get("center", {}).get("lon"))
-            if lat_ and lon_:
-                hospitals.append({"name": name, "lat": lat_, "lon": lon_})
-
-        print(f"✅ Found {len(hospitals)} hospitals nearby.")
-        return hospitals
-
+        with timed("overpass"):
+            response = http.get(OVERPASS_URL, params={"data": query}, timeout=(3.05, 25))
+            response.raise_for_status()
+            data = response.json()
     except requests.exceptions.Timeout:
         print("[ERROR] Overpass API timed out.")
-        return []
+        return None
+    except CircuitOpen as e:
+        print(f"⚠️ Overpass skipped: {e}")
+        return None
     except Exception as e:
         print(f"[ERROR] Failed to retrieve hospitals: {e}")
-        return []
+        return None
+    return parse_hospitals(data.get("elements", []))
+
+
+def _store_cells(covered, hospitals):
+    """Cache each cell separately (empty cells included). Returns {cell: hospitals}."""
+    by_cell = {cell: [] for cell in covered}
+    for h in hospitals:
+        cell = _cell_of(h["lat"], h["lon"])
+        if cell in by_cell:
+            by_cell[cell].append(h)
+    for cell, found in by_cell.items():
+        tile_cache.set(_tile_key(cell), found)
+    return by_cell
+
+
+def _start_fetch(cells):
+    """
+    Start the Overpass queries for `cells` on the shared pool and return
+    their futures (each resolves to a list of hospitals or None). The cells
+    are cached once every part has succeeded.
+    """
+    bbox, covered = _cell_range(cells)
+    kinds = ("node", "way", "relation") if OVERPASS_SPLIT else ("nwr",)
+    results = {}
+    results_lock = threading.Lock()
+
+    def finished(kind, future):
+        with _pending_lock:
+            _pending.pop((bbox, kind), None)
+        with results_lock:
+            results[kind] = future.result()
+            if len(results) < len(kinds) or any(r is None for r in results.values()):
+                return
+        _store_cells(covered, [h for part in results.values() for h in part])
+
+    futures = []
+    started = []
+    with _pending_lock:
+        for kind in kinds:
+            future = _pending.get((bbox, kind))
+            if future is None:
+                future = _pending[(bbox, kind)] = _overpass_pool.submit(_query_overpass, bbox, kind)
+                started.append((kind, future))
+            futures.append(future)
+    # Outside the lock: a future that is already done runs its callback right away
+    for kind, future in started:
+        future.add_done_callback(lambda f, kind=kind: finished(kind, f))
+    return futures
+
+
+def _strips(cells):
+    """
+    Split `cells` into rectangles that hold only those cells: runs of
+    adjacent cells in a row, merged with the runs directly above that span
+    the same columns. A ring around a search becomes four edge strips.
+    """
+    runs = []
+    for r, c in sorted(cells):
+        if runs and runs[-1][0] == r and runs[-1][2] == c - 1:
+            runs[-1][2] = c
+        else:
+            runs.append([r, c, c])
+    rects = {}  # (col_lo, col_hi) -> [row_lo, row_hi] of the rectangle still growing
+    done = []
+    for r, lo, hi in runs:
+        rect = rects.get((lo, hi))
+        if rect is not None and rect[1] == r - 1:
+            rect[1] = r
+        else:
+            if rect is not None:
+                done.append((rect, lo, hi))
+            rects[(lo, hi)] = [r, r]
+    done.extend((rect, lo, hi) for (lo, hi), rect in rects.items())
+    return [
+        [(r, c) for r in range(rows[0], rows[1] + 1) for c in range(lo, hi + 1)]
+        for rows, lo, hi in done
+    ]
+
+
+def _fetch_cells(cells):
+    """
+    Fetch `cells` with one Overpass bbox query per rectangle of cells (see
+    _strips) and cache each cell separately. Returns {cell: hospitals}, or
+    None if a query failed.
+    """
+    fetched = {}
+    for strip in _strips(cells):
+        bbox, covered = _cell_range(strip)
+        hospitals = _query_overpass(bbox)
+        if hospitals is None:
+            return None
+        fetched.update(_store_cells(covered, hospitals))
+    return fetched
+
+
+def _prefetch(cells):
+    """Warm neighboring cells in the background so the next nearby search is a cache hit."""
+    if http.breaker(OVERPASS_URL).is_open:
+        return
+    with _prefetch_lock:
+        todo = [c for c in cells if c not in _prefetching and not tile_cache.has(_tile_key(c))]
+        _prefetching.update(todo)
+    if not todo:
+        return
+
+    def run():
+        try:
+            _fetch_cells(todo)
+        finally:
+            with _prefetch_lock:
+                _prefetching.difference_update(todo)
+
+    _prefetch_pool.submit(run)
 
 
 # ───────────────────────────────────────────────
 # 3. Create map
 # ───────────────────────────────────────────────
-def create_map(lat, lon, hospitals, postal_code, country):
+MAP_DIR = os.path.join("static", "maps")
+MAP_MAX_FILES = int(os.getenv("MAP_MAX_FILES", "200"))
+MAP_MAX_BYTES = int(os.getenv("MAP_MAX_BYTES", str(50 * 1024 * 1024)))
+
+
+def map_key(lat, lon, radius, count=0, label=""):
+    """
+    Name of the rendered map for a location. Coordinates are rounded to
+    ~10 m so repeated searches for the same postal code reuse one file;
+    the hospital count keeps a map drawn from partial results from being
+    reused once the full list is known. The "you are here" label is part
+    of the file, so it is part of the name too.
+    """
+    raw = f"{round(float(lat), 4)}:{round(float(lon), 4)}:{int(radius)}:{int(count)}:{label}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:20]
+
+
+def map_path(key):
+    return os.path.join(MAP_DIR, f"{key}.html")
+
+
+def cleanup_maps(max_files=MAP_MAX_FILES, max_bytes=MAP_MAX_BYTES):
+    """Delete the least recently used maps until both limits are met."""
+    try:
+        entries = []
+        with os.scandir(MAP_DIR) as it:
+            for entry in it:
+                if entry.name.endswith(".html"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+    except FileNotFoundError:
+        return
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    while entries and (len(entries) > max_files or total > max_bytes):
+        _, size, path = entries.pop(0)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def create_map(lat, lon, hospitals, postal_code, country, radius=5000):
+    """
+    Render the map for a location into static/maps/<key>.html and return the key.
+    An existing map for the same location is reused instead of being rendered again.
+    """
+    key = map_key(lat, lon, radius, len(hospitals), f"{postal_code}, {country}")
+    output_path = map_path(key)
+    if os.path.exists(output_path):
+        os.utime(output_path)  # mark as recently used for cleanup
+        return key
+
+    with timed("map_render"):
+        return _render_map(key, output_path, lat, lon, hospitals, postal_code, country)
+
+
+def _render_map(key, output_path, lat, lon, hospitals, postal_code, country):
     try:
+        import folium  # only needed for server-side rendering
+
         fmap = folium.Map(location=[lat, lon], zoom_start=13, tiles="CartoDB positron")
 
         folium.Marker(
             [lat, lon],
-            popup=f"{postal_code}, {country}\n(You are here)",
+            # folium inserts popups as HTML: the label comes from the query string, names from OSM
+            popup=f"{html.escape(f'{postal_code}, {country}')}<br>(You are here)",
             icon=folium.Icon(color="blue", icon="home"),
         ).add_to(fmap)
 
         for h in hospitals:
             folium.Marker(
                 [h["lat"], h["lon"]],
-                popup=h["name"],
+                popup=html.escape(h["name"]),
                 icon=folium.Icon(color="red", icon="plus-sign"),
             ).add_to(fmap)
 
-        output_dir = "static"
-        os.makedirs(output_dir, exist_ok=True)
-        output_path = os.path.join(output_dir, "hospitals_near_me.html")
-        fmap.save(output_path)
+        os.makedirs(MAP_DIR, exist_ok=True)
+        # Write to a private temp file first so concurrent searches never see a partial map
+        fd, tmp_path = tempfile.mkstemp(dir=MAP_DIR, suffix=".tmp")
+        os.close(fd)
+        try:
+            fmap.save(tmp_path)
+            os.replace(tmp_path, output_path)
+        except BaseException:
+            # cleanup_maps() only looks at *.html, so a leftover would never be removed
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        cleanup_maps()
 
         print(f"✅ Map saved at: {output_path}")
-        return output_path
+        return key
 
     except Exception as e:
         print(f"[ERROR] Failed to create map: {e}")
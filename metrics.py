@@ -0,0 +1,234 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, g, has_request_context, request
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+# ───────────────────────────────────────────────
+# Metric types (Prometheus text format)
+# ───────────────────────────────────────────────
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.labels + ("le",)
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{_format_labels(names, key + (bound,))} {bucket_count}")
+                lines.append(f"{self.name}_bucket{_format_labels(names, key + ('+Inf',))} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, *args, **kwargs):
+        metric = Counter(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, *args, **kwargs):
+        metric = Histogram(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collect):
+        """`collect()` returns lines in the text format; called on every scrape."""
+        self._collectors.append(collect)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            lines.extend(collect())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+stage_seconds = registry.histogram(
+    "livehealthy_stage_duration_seconds", "Time spent in one stage of a request.", labels=("stage",)
+)
+request_seconds = registry.histogram(
+    "livehealthy_http_request_duration_seconds", "Time to produce a response.", labels=("endpoint", "method", "status")
+)
+llm_tokens = registry.counter(
+    "livehealthy_llm_tokens_total", "Tokens reported by the model.", labels=("chain", "kind")
+)
+
+
+# ───────────────────────────────────────────────
+# Spans
+# ───────────────────────────────────────────────
+@contextmanager
+def timed(stage):
+    """Record how long the block takes, and add it to the request's Server-Timing header."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        stage_seconds.observe(elapsed, stage=stage)
+        if has_request_context():
+            g.setdefault("server_timing", []).append((stage, elapsed))
+
+
+def cache_collector(caches):
+    """Expose the hit/miss counters of several ResponseCaches, keyed by name."""
+    def collect():
+        lines = [
+            "# TYPE livehealthy_cache_hits_total counter",
+            "# TYPE livehealthy_cache_misses_total counter",
+            "# TYPE livehealthy_cache_hit_ratio gauge",
+        ]
+        for name, cache in caches.items():
+            stats = cache.stats()
+            lines.append(f'livehealthy_cache_hits_total{{cache="{name}"}} {stats["hits"]}')
+            lines.append(f'livehealthy_cache_misses_total{{cache="{name}"}} {stats["misses"]}')
+            lines.append(f'livehealthy_cache_hit_ratio{{cache="{name}"}} {stats["hit_rate"]}')
+        return lines
+    return collect
+
+
+def stats_collector(prefix, stats):
+    """Expose a stats() dict of numbers as gauges named <prefix>_<key>."""
+    def collect():
+        lines = []
+        for key, value in stats().items():
+            lines.append(f"# TYPE {prefix}_{key} gauge")
+            lines.append(f"{prefix}_{key} {value}")
+        return lines
+    return collect
+
+
+_token_handler_class = None
+
+
+def token_callback(chain):
+    """A LangChain callback that adds the model's reported token usage to llm_tokens."""
+    global _token_handler_class
+    if _token_handler_class is None:
+        from langchain_core.callbacks import BaseCallbackHandler
+
+        class TokenUsageHandler(BaseCallbackHandler):
+            def __init__(self, chain):
+                self.chain = chain
+                self.streamed = False
+
+            def on_llm_new_token(self, token, *, chunk=None, **kwargs):
+                # Streamed chunks carry usage deltas. Count them here: merging
+                # them into the final result drops repeated equal values.
+                usage = (getattr(chunk, "generation_info", None) or {}).get("usage_metadata")
+                if usage:
+                    self.streamed = True
+                    self._record(usage)
+
+            def on_llm_end(self, response, **kwargs):
+                if self.streamed:
+                    return
+                # Per-generation usage if the model reports it, otherwise the batch total
+                usages = [
+                    (gen.generation_info or {}).get("usage_metadata")
+                    for generations in response.generations
+                    for gen in generations
+                ]
+                usages = [u for u in usages if u] or [(response.llm_output or {}).get("usage_metadata") or {}]
+                for usage in usages:
+                    self._record(usage)
+
+            def _record(self, usage):
+                prompt = usage.get("prompt_token_count", usage.get("input_tokens", 0)) or 0
+                completion = usage.get("candidates_token_count", usage.get("output_tokens", 0)) or 0
+                llm_tokens.inc(prompt, chain=self.chain, kind="prompt")
+                llm_tokens.inc(completion, chain=self.chain, kind="completion")
+
+        _token_handler_class = TokenUsageHandler
+    return _token_handler_class(chain)
+
+
+# ───────────────────────────────────────────────
+# Flask integration
+# ───────────────────────────────────────────────
+def init_metrics(app, server_timing=True):
+    """Time every request, add Server-Timing headers and serve /metrics."""
+
+    @app.before_request
+    def _start_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def _record(response):
+        start = g.pop("request_start", None)
+        if start is not None:
+            elapsed = time.perf_counter() - start
+            request_seconds.observe(
+                elapsed, endpoint=request.endpoint or "unknown", method=request.method, status=response.status_code
+            )
+            if server_timing:
+                parts = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in g.get("server_timing", [])]
+                parts.append(f"total;dur={elapsed * 1000:.1f}")
+                response.headers["Server-Timing"] = ", ".join(parts)
+        return response
+
+    @app.route("/metrics")
+    def metrics():
+        return Response(registry.render(), mimetype="text/plain; version=0.0.4")
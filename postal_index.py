@@ -0,0 +1,114 @@
+import io
+import os
+import threading
+import zipfile
+from array import array
+
+
+# Country names users commonly type, mapped to ISO 3166 alpha-2 codes
+COUNTRY_CODES = {
+    "united states": "US", "united states of america": "US", "usa": "US", "america": "US",
+    "canada": "CA", "mexico": "MX", "brazil": "BR", "argentina": "AR",
+    "united kingdom": "GB", "uk": "GB", "great britain": "GB", "england": "GB", "ireland": "IE",
+    "france": "FR", "germany": "DE", "spain": "ES", "portugal": "PT", "italy": "IT",
+    "netherlands": "NL", "belgium": "BE", "switzerland": "CH", "austria": "AT",
+    "sweden": "SE", "norway": "NO", "denmark": "DK", "finland": "FI", "poland": "PL",
+    "india": "IN", "china": "CN", "japan": "JP", "south korea": "KR", "korea": "KR",
+    "vietnam": "VN", "viet nam": "VN", "thailand": "TH", "philippines": "PH",
+    "malaysia": "MY", "singapore": "SG", "indonesia": "ID",
+    "australia": "AU", "new zealand": "NZ", "south africa": "ZA",
+}
+
+
+def country_code(country):
+    """Best-effort ISO alpha-2 code for a user-entered country name."""
+    value = (country or "").strip()
+    if value.lower() in COUNTRY_CODES:
+        return COUNTRY_CODES[value.lower()]
+    if len(value) == 2 and value.isalpha():
+        return value.upper()
+    return None
+
+
+def normalize_postal_code(postal_code, code=None):
+    value = (postal_code or "").strip().upper().replace(" ", "")
+    if code == "US":
+        value = value.split("-")[0]  # ZIP+4 -> ZIP
+    return value
+
+
+# ───────────────────────────────────────────────
+# Offline postal-code centroids
+# ───────────────────────────────────────────────
+class PostalIndex:
+    """
+    Postal-code centroids loaded from a GeoNames-style TSV
+    (country code, postal code, place name, admin fields..., latitude, longitude, ...).
+    Coordinates are kept in two flat float arrays; the dict only maps keys to offsets.
+    """
+
+    def __init__(self):
+        self._offsets = {}
+        self._lats = array("d")
+        self._lons = array("d")
+
+    def __len__(self):
+        return len(self._offsets)
+
+    @classmethod
+    def from_file(cls, path):
+        index = cls()
+        if path.endswith(".zip"):
+            with zipfile.ZipFile(path) as archive:
+                for name in archive.namelist():
+                    if name.endswith(".txt") and not name.lower().startswith("readme"):
+                        with archive.open(name) as raw:
+                            index.load(io.TextIOWrapper(raw, encoding="utf-8"))
+        else:
+            with open(path, encoding="utf-8") as f:
+                index.load(f)
+        return index
+
+    def load(self, lines):
+        for line in lines:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 11:
+                continue
+            code = fields[0].upper()
+            key = f"{code}:{normalize_postal_code(fields[1], code)}"
+            if key in self._offsets:
+                continue  # keep the first place listed for a postal code
+            try:
+                lat, lon = float(fields[9]), float(fields[10])
+            except ValueError:
+                continue
+            self._offsets[key] = len(self._lats)
+            self._lats.append(lat)
+            self._lons.append(lon)
+
+    def lookup(self, postal_code, country):
+        code = country_code(country)
+        if not code:
+            return None
+        offset = self._offsets.get(f"{code}:{normalize_postal_code(postal_code, code)}")
+        if offset is None:
+            return None
+        return self._lats[offset], self._lons[offset]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_postal_index():
+    """The index from POSTAL_INDEX_PATH, loaded on first use (None if not configured)."""
+    global _index
+    path = os.getenv("POSTAL_INDEX_PATH")
+    if not path or not os.path.exists(path):
+        return None
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = PostalIndex.from_file(path)
+                print(f"✅ Loaded {len(_index)} postal codes from {path}")
+    return _index
@@ -0,0 +1,280 @@
+"""
+Precomputed recommendations for common profiles.
+
+Most profiles fall into a small number of buckets (disease set, age band,
+sex, race, BMI band), and answers are already shared per bucket by the
+response cache. This job generates the answers for a chosen set of buckets
+ahead of time and writes them to one gzip JSON artifact:
+
+    python precompute.py build --from-users 25 --workers 8 --rate 5
+    python precompute.py build --diseases "Diabetes" "Diabetes+Hypertension" --dry-run
+
+Then set PRECOMPUTED_PATH (default data/precomputed.json.gz). The routes
+look answers up in it by cache key before the cache and the model; the file
+is reloaded when it changes. Keys include the template hashes, so answers
+built from an older prompt are simply never matched.
+"""
+import argparse
+import gzip
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+PRECOMPUTED_PATH = os.getenv("PRECOMPUTED_PATH", os.path.join("data", "precomputed.json.gz"))
+FORMAT_VERSION = 1
+
+
+# ───────────────────────────────────────────────
+# Artifact
+# ───────────────────────────────────────────────
+class PrecomputedAnswers:
+    """
+    Answers keyed by prompt.cache_key(), read from the artifact on first use
+    and re-read when its mtime changes (checked at most every
+    `check_interval` seconds). A missing file simply has no answers.
+    """
+
+    def __init__(self, path, check_interval=30.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked = float("-inf")
+        self._index = {}
+        self._answers = []
+        self.hits = 0
+
+    def _refresh(self):
+        now = time.monotonic()
+        if now - self._checked < self.check_interval:
+            return
+        with self._lock:
+            self._checked = now
+            try:
+                mtime = os.path.getmtime(self.path)
+            except OSError:
+                self._index, self._answers, self._mtime = {}, [], None
+                return
+            if mtime == self._mtime:
+                return
+            try:
+                data = read_artifact(self.path)
+            except (OSError, ValueError) as e:
+                print(f"[ERROR] Failed to load precomputed answers: {e}")
+                return
+            self._index, self._answers = data["index"], data["answers"]
+            self._mtime = mtime
+            print(f"✅ Loaded {len(self._index)} precomputed answers from {self.path}")
+
+    def get(self, key):
+        self._refresh()
+        i = self._index.get(key)
+        if i is None:
+            return None
+        self.hits += 1
+        return self._answers[i]
+
+    def stats(self):
+        return {"entries": len(self._index), "hits": self.hits}
+
+
+def read_artifact(path):
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        data = json.load(f)
+    if data.get("version") != FORMAT_VERSION:
+        raise ValueError(f"unsupported artifact version {data.get('version')}")
+    return data
+
+
+def write_artifact(path, entries):
+    """Write {cache key: answer} with identical answers stored once."""
+    answers = []
+    positions = {}
+    index = {}
+    for key, answer in sorted(entries.items()):
+        if answer not in positions:
+            positions[answer] = len(answers)
+            answers.append(answer)
+        index[key] = positions[answer]
+    folder = os.path.dirname(path) or "."
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=folder, suffix=".tmp")
+    with os.fdopen(fd, "wb") as raw, gzip.open(raw, "wt", encoding="utf-8") as f:
+        json.dump({"version": FORMAT_VERSION, "created": time.time(), "index": index, "answers": answers}, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+precomputed = PrecomputedAnswers(PRECOMPUTED_PATH)
+
+
+# ───────────────────────────────────────────────
+# Buckets
+# ───────────────────────────────────────────────
+AGE_BANDS = ["20-29", "30-39", "40-49", "50-59", "60-69", "70-79"]
+SEXES = ["Male", "Female"]
+RACES = [
+    "Asian", "White", "Black or African American", "Hispanic or Latino",
+    "Native American or Alaska Native", "Native Hawaiian or Pacific Islander", "Mixed", "Other",
+]
+BMI_BANDS = {"under": 17.0, "normal": 22.0, "over": 27.5, "obese1": 32.5, "obese2": 37.5, "obese3": 42.0}
+REFERENCE_HEIGHT = 170  # cm; the weight is chosen to land in the BMI band
+
+
+def bucket_profile(diseases, age_band, sex, race, bmi_band):
+    """A representative profile for one bucket (what read_profile() would return)."""
+    low = int(age_band.split("-")[0])
+    weight = round(BMI_BANDS[bmi_band] * (REFERENCE_HEIGHT / 100) ** 2, 1)
+    return {
+        "name": None,
+        "age": str(low + 5),
+        "weight": weight,
+        "height": str(REFERENCE_HEIGHT),
+        "sex": sex,
+        "race": race,
+        "diseases": list(diseases),
+    }
+
+
+def disease_sets_from_users(limit):
+    """The most common disease combinations among stored submissions."""
+    from catalog import disease_catalog
+    from user_store import UserStore
+
+    store = UserStore(os.getenv("USER_DB", "user_data.sqlite3"))
+    counts = Counter()
+    for _name, _age, _weight, _height, disease in store.iter_rows():
+        names = [disease_catalog.canonical(d) for d in (disease or "").split(";") if d.strip()]
+        if names and None not in names:
+            counts[tuple(sorted(set(names)))] += 1
+    return [list(s) for s, _ in counts.most_common(limit)]
+
+
+def parse_disease_sets(values):
+    """["Diabetes", "Diabetes+Hypertension"] -> canonical disease lists (unknown names are an error)."""
+    from catalog import disease_catalog
+
+    sets = []
+    for value in values:
+        names = []
+        for name in value.split("+"):
+            canonical = disease_catalog.canonical(name)
+            if canonical is None:
+                raise SystemExit(f"Unknown disease: {name}")
+            names.append(canonical)
+        sets.append(names)
+    return sets
+
+
+# ───────────────────────────────────────────────
+# Build job
+# ───────────────────────────────────────────────
+class RateLimiter:
+    """At most `rate` acquisitions per second, shared by all worker threads."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next = time.monotonic()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+def build(out, profiles, workers=8, rate=0.0, categories=("food", "routine", "important")):
+    """
+    Generate every category for every profile and write the artifact.
+    Answers already in `out` (same cache key) are kept and not regenerated.
+    """
+    import prompt
+    from sanitize import sanitize
+
+    entries = {}
+    if os.path.exists(out):
+        data = read_artifact(out)
+        entries = {key: data["answers"][i] for key, i in data["index"].items()}
+    generators = {"food": prompt._food_for, "routine": prompt._routine_for, "important": prompt._important_for}
+    limiter = RateLimiter(rate)
+    lock = threading.Lock()
+
+    def run(profile):
+        for category in categories:
+            key = prompt.cache_key(category, profile)
+            if key in entries:
+                continue
+            limiter.acquire()
+            answer = generators[category](profile)
+            with lock:
+                entries[key] = answer
+                entries[prompt.clean_key(key)] = sanitize(category, answer)
+
+    done = failed = 0
+    started = time.monotonic()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(run, p) for p in profiles]
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                    done += 1
+                except Exception as e:
+                    failed += 1
+                    print(f"[ERROR] Bucket failed: {e}")
+                if (done + failed) % 50 == 0:
+                    print(f"… {done + failed}/{len(profiles)} buckets ({time.monotonic() - started:.0f}s)")
+    except KeyboardInterrupt:
+        print("⚠️ Interrupted; writing what is done so far.")
+    with lock:
+        write_artifact(out, dict(entries))
+    print(f"✅ Wrote {len(entries)} answers to {out} ({done} buckets done, {failed} failed)")
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    b = sub.add_parser("build", help="generate answers for a grid of buckets")
+    b.add_argument("--out", default=PRECOMPUTED_PATH)
+    b.add_argument("--diseases", nargs="*", default=[], help='disease sets, e.g. "Diabetes" "Diabetes+Hypertension"')
+    b.add_argument("--from-users", type=int, default=0, metavar="N", help="add the N most common disease sets from USER_DB")
+    b.add_argument("--ages", nargs="*", default=AGE_BANDS)
+    b.add_argument("--sexes", nargs="*", default=SEXES)
+    b.add_argument("--races", nargs="*", default=RACES)
+    b.add_argument("--bmis", nargs="*", default=["normal", "over", "obese1"], choices=list(BMI_BANDS))
+    b.add_argument("--workers", type=int, default=8)
+    b.add_argument("--rate", type=float, default=5.0, help="model calls per second (0 for no limit)")
+    b.add_argument("--limit", type=int, help="stop after this many buckets")
+    b.add_argument("--dry-run", action="store_true", help="only print how many buckets would be built")
+    args = parser.parse_args()
+
+    disease_sets = parse_disease_sets(args.diseases)
+    if args.from_users:
+        disease_sets += [s for s in disease_sets_from_users(args.from_users) if s not in disease_sets]
+    if not disease_sets:
+        raise SystemExit("No disease sets: pass --diseases and/or --from-users N")
+
+    grid = itertools.product(disease_sets, args.ages, args.sexes, args.races, args.bmis)
+    profiles = [bucket_profile(*bucket) for bucket in itertools.islice(grid, args.limit)]
+    print(f"{len(profiles)} buckets, {len(profiles) * 3} model calls at most")
+    if args.dry_run:
+        return
+
+    # Every worker needs a model slot, and the queue must not time out behind them
+    os.environ["LLM_MAX_IN_FLIGHT"] = str(args.workers)
+    os.environ["LLM_QUEUE_TIMEOUT"] = "600"
+    build(args.out, profiles, workers=args.workers, rate=args.rate)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,17 @@
-from langchain.prompts import PromptTemplate 
-from langchain.chains import LLMChain, SimpleSequentialChain 
-from langchain_google_vertexai import VertexAI 
 from flask import request 
 import os 
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from cache import ResponseCache, hash_text, make_key
+from catalog import disease_catalog
+from limits import LLMGate
+from metrics import timed, token_callback
+from sanitize import sanitize
+from singleflight import SingleFlight
 from dotenv import load_dotenv 
 
 load_dotenv()
-
-# Initialize LLM model 
-my_llm_model = VertexAI( 
-    model=os.getenv("MODEL"), 
-    project=os.getenv("PROJECT"), 
-    location=os.getenv("LOCATION") 
-) 
+from precompute import precomputed  # reads PRECOMPUTED_PATH, so after load_dotenv
 
 # Template for nutrition and exrcise 
 # template_nutrition_food_exercise =""" 
@@ -145,13 +144,6 @@ Format Example:
 Now generate your own HTML fragment following this structure and style using the provided {information}.
 """
 
-prompt_nutrition_food_exercise = PromptTemplate( 
-    input_variables=["information"], 
-    template=template_nutrition_food_exercise, 
-) 
-
-nutrition_food_exercise_chain = LLMChain(llm=my_llm_model, prompt=prompt_nutrition_food_exercise) 
-
 template_routine = """
 You are a medical nutrition and fitness expert. 
 Generate a clean HTML fragment (not a full page) showing a daily routine table from 5–6 AM to 10–11 PM based on: {list_of_food_and_exercise}.
@@ -183,16 +175,6 @@ Now generate your table using the same format based on {list_of_food_and_exercis
 
 
 
-prompt_routine = PromptTemplate( 
-    input_variables=["list_of_food_and_exercise"], 
-    template=template_routine, 
-) 
-
-routine_chain = LLMChain(llm=my_llm_model, prompt=prompt_routine) 
-
-# Combine both chains 
-chain = SimpleSequentialChain(chains=[nutrition_food_exercise_chain, routine_chain]) 
-
 # Template of the important thing 
 template_nutrition_important =""" 
 You are a medical nutrition expert. The characteristic of person : {information} List exactly **10** essential things to notice for the disease(s). In each list item, highlight the single most important key phrase using <strong> tags. ONLY return a clean HTML unordered list (<ul>). Do not include <html> or <body> tags. No explanations, just the list. **IMPORTANT: Do NOT include markdown delimiters like
@@ -212,51 +194,286 @@ or
 </ul> 
 """ 
 
-prompt_nuitrion_important= PromptTemplate( 
-    input_variables=["information"], 
-    template=template_nutrition_important, 
-) 
-
-important_chain= LLMChain(llm=my_llm_model, prompt=prompt_nuitrion_important) 
+# ───────────────────────────────────────────────
+# Model and chains (built on first use)
+# ───────────────────────────────────────────────
+# langchain and the Vertex client are slow to import and construct, so they
+# are only loaded when the first answer is generated (or by warm_up()).
+_llm = None
+_chains = None
+_init_lock = threading.Lock()
+
+def get_llm():
+    global _llm
+    if _llm is None:
+        with _init_lock:
+            if _llm is None:
+                from langchain_google_vertexai import VertexAI
+                _llm = VertexAI( 
+                    model=os.getenv("MODEL"), 
+                    project=os.getenv("PROJECT"), 
+                    location=os.getenv("LOCATION") 
+                ) 
+    return _llm
+
+def set_llm(model):
+    """Use `model` (any LangChain LLM) instead of Vertex AI, e.g. a fake in benchmarks."""
+    global _llm, _chains
+    with _init_lock:
+        _llm = model
+        _chains = None
+
+def _chain(category):
+    global _chains
+    if _chains is None:
+        llm = get_llm()
+        with _init_lock:
+            if _chains is None:
+                from langchain.prompts import PromptTemplate
+                from langchain.chains import LLMChain
+                prompt_nutrition_food_exercise = PromptTemplate( 
+                    input_variables=["information"], 
+                    template=template_nutrition_food_exercise, 
+                ) 
+                prompt_routine = PromptTemplate( 
+                    input_variables=["list_of_food_and_exercise"], 
+                    template=template_routine, 
+                ) 
+                prompt_nuitrion_important= PromptTemplate( 
+                    input_variables=["information"], 
+                    template=template_nutrition_important, 
+                ) 
+                _chains = {
+                    "food": LLMChain(llm=llm, prompt=prompt_nutrition_food_exercise),
+                    "routine": LLMChain(llm=llm, prompt=prompt_routine),
+                    "important": LLMChain(llm=llm, prompt=prompt_nuitrion_important),
+                }
+    return _chains[category]
+
+_LAZY_NAMES = {
+    "nutrition_food_exercise_chain": "food",
+    "routine_chain": "routine",
+    "important_chain": "important",
+}
+
+def __getattr__(name):
+    # Keep the old module-level names working without building them at import
+    if name == "my_llm_model":
+        return get_llm()
+    if name in _LAZY_NAMES:
+        return _chain(_LAZY_NAMES[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def warm_up():
+    """Build the client and chains and open a connection to Vertex ahead of the first request."""
+    try:
+        for category in ("food", "routine", "important"):
+            _chain(category)
+        get_llm().get_num_tokens("warm up")
+        print("✅ LLM client warmed up")
+    except Exception as e:
+        print(f"[ERROR] LLM warm-up failed: {e}")
+
+# Response cache (in-process LRU, optional SQLite file via CACHE_DB)
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("CACHE_MAX_ENTRIES", "256")),
+    ttl=int(os.getenv("CACHE_TTL", "86400")),
+    db_path=os.getenv("CACHE_DB") or None,
+    max_disk_entries=int(os.getenv("CACHE_MAX_DISK_ENTRIES", "10000")),
+)
+
+# Worker pool for running independent chains concurrently
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("LLM_WORKERS", "8")))
+
+TEMPLATE_HASHES = {
+    "food": hash_text(template_nutrition_food_exercise),
+    "routine": hash_text(template_nutrition_food_exercise + template_routine),
+    "important": hash_text(template_nutrition_important),
+}
+
+class InvalidProfile(ValueError):
+    """The submitted form cannot be turned into a prompt."""
+
+def read_profile(form=None):
+    """
+    Read the patient profile from the submitted form.
+    Diseases are checked against the catalog and returned in its spelling.
+    """
+    form = form if form is not None else request.form
+    try:
+        weight = float(form.get("weight"))
+    except (TypeError, ValueError):
+        raise InvalidProfile("Please enter a valid weight.")
+    diseases = []
+    for name in form.getlist("disease"):
+        canonical = disease_catalog.canonical(name)
+        if canonical is None:
+            raise InvalidProfile(f"Unknown disease: {name}")
+        if canonical not in diseases:
+            diseases.append(canonical)
+    return {
+        "name": form.get("name"),
+        "age": form.get("age"),
+        "weight": weight,
+        "height": form.get("height"),
+        "sex": form.get("sex"),
+        "race": form.get("race"),
+        "diseases": diseases,
+    }
+
+def build_question_str(profile):
+    return f"Diseases: {', '.join(profile['diseases'])}; Weight: {profile['weight']}kg ; Age:{profile['age']} ; Height: {profile['height']}cm ; Sex: {profile['sex']} ; Race: {profile['race']}"
+
+def _age_band(age):
+    try:
+        decade = int(float(age)) // 10 * 10
+    except (TypeError, ValueError):
+        return None
+    return f"{decade}-{decade + 9}"
+
+def _bmi_band(weight, height):
+    try:
+        bmi = float(weight) / (float(height) / 100) ** 2
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+    for limit, band in ((18.5, "under"), (25, "normal"), (30, "over"), (35, "obese1"), (40, "obese2")):
+        if bmi < limit:
+            return band
+    return "obese3"
+
+def normalize_profile(profile):
+    """
+    Reduce a profile to the fields that change the recommendation.
+    The name is dropped, age and weight/height are bucketed and diseases are sorted.
+    """
+    return {
+        "age": _age_band(profile["age"]),
+        "bmi": _bmi_band(profile["weight"], profile["height"]),
+        "sex": (profile["sex"] or "").strip().lower(),
+        "race": (profile["race"] or "").strip().lower(),
+        "diseases": sorted({d.strip().lower() for d in profile["diseases"] if d.strip()}),
+    }
+
+def cache_key(category, profile):
+    return make_key(category, TEMPLATE_HASHES[category], normalize_profile(profile))
+
+def clean_key(key):
+    """Where the sanitized version of the answer under `key` is cached."""
+    return make_key("clean", key)
+
+# Cap on concurrent Vertex calls; excess callers queue briefly or are rejected
+llm_gate = LLMGate(
+    max_in_flight=int(os.getenv("LLM_MAX_IN_FLIGHT", "4")),
+    max_queue=int(os.getenv("LLM_MAX_QUEUE", "16")),
+    queue_timeout=float(os.getenv("LLM_QUEUE_TIMEOUT", "10")),
+)
+
+def _run_chain(category, value):
+    with llm_gate.slot():
+        with timed(f"llm_{category}"):
+            return _chain(category).run(value, callbacks=[token_callback(category)])
+
+# Identical profiles submitted at the same time share one model call
+inflight = SingleFlight()
+
+def _lookup(key):
+    """The precomputed artifact first (a dict lookup), then the response cache."""
+    answer = precomputed.get(key)
+    if answer is None:
+        answer = response_cache.get(key)
+    return answer
+
+def _cached_run(category, profile, compute):
+    key = cache_key(category, profile)
+    answer = _lookup(key)
+    if answer is None:
+        answer = inflight.do(key, lambda: _compute_and_store(key, compute))
+    return answer
+
+def _compute_and_store(key, compute):
+    answer = compute()
+    response_cache.set(key, answer)
+    return answer
+
+def _food_for(profile):
+    return _cached_run("food", profile, lambda: _run_chain("food", build_question_str(profile)))
+
+def _routine_for(profile):
+    # The routine is built from the food/exercise answer, so reuse it (and its cache entry)
+    return _cached_run("routine", profile, lambda: _run_chain("routine", _food_for(profile)))
+
+def _important_for(profile):
+    return _cached_run("important", profile, lambda: _run_chain("important", build_question_str(profile)))
+
+def _clean(category, profile, raw_for):
+    """The sanitized answer, cached next to the raw one (which later chains still use)."""
+    key = clean_key(cache_key(category, profile))
+    cleaned = _lookup(key)
+    if cleaned is None:
+        cleaned = sanitize(category, raw_for(profile))
+        response_cache.set(key, cleaned)
+    return cleaned
 
 def generate_routine(): 
     """ 
     Input: diseases: list of disease names (strings) weight: user's weight in kg (float) Output: str: LLM-generated routine text 
     """ 
-    # Build input string 
-    name = request.form.get("name") 
-    age = request.form.get("age") 
-    weight = float(request.form.get("weight")) 
-    height = request.form.get('height') 
-    sex = request.form.get('sex') 
-    race = request.form.get('race') 
-    selected_diseases = request.form.getlist("disease") 
-    question_str = f"Diseases: {', '.join(selected_diseases)}; Weight: {weight}kg ; Age:{age} ; Height: {height}cm ; Sex: {sex} ; Race: {race}" 
-    answer = chain.run(question_str) 
-    return answer 
+    return _clean("routine", read_profile(), _routine_for)
 
 def generate_food_exercise(): 
-    # build input string 
-    name = request.form.get("name") 
-    age = request.form.get("age") 
-    weight = float(request.form.get("weight")) 
-    height = request.form.get('height') 
-    sex = request.form.get('sex') 
-    race = request.form.get('race') 
-    selected_diseases = request.form.getlist("disease") 
-    question_str = f"Diseases: {', '.join(selected_diseases)}; Weight: {weight}kg ; Age:{age} ; Height: {height}cm ; Sex: {sex} ; Race: {race}" 
-    answer = nutrition_food_exercise_chain.run(question_str) 
-    return answer 
+    return _clean("food", read_profile(), _food_for)
 
 def generate_important(): 
-    # build input string 
-    name = request.form.get("name") 
-    age = request.form.get("age") 
-    weight = float(request.form.get("weight")) 
-    height = request.form.get('height') 
-    sex = request.form.get('sex') 
-    race = request.form.get('race') 
-    selected_diseases = request.form.getlist("disease") 
-    question_str = f"Diseases: {', '.join(selected_diseases)}; Weight: {weight}kg ; Age:{age} ; Height: {height}cm ; Sex: {sex} ; Race: {race}" 
-    answer = important_chain.run(question_str) 
-    return answer 
+    return _clean("important", read_profile(), _important_for)
+
+# ───────────────────────────────────────────────
+# Streaming
+# ───────────────────────────────────────────────
+def _prompt_for(category, profile):
+    if category == "food":
+        return _chain("food").prompt.format(information=build_question_str(profile))
+    if category == "routine":
+        return _chain("routine").prompt.format(list_of_food_and_exercise=_food_for(profile))
+    if category == "important":
+        return _chain("important").prompt.format(information=build_question_str(profile))
+    raise ValueError(f"Unknown category: {category}")
+
+def stream_content(category, profile):
+    """
+    Yield the answer for `category` chunk by chunk as the model produces it.
+    Cached answers are yielded in one piece, as is the answer of an identical
+    call already running (streamed or not); a completed stream is cached
+    (raw and sanitized). A model call first yields "" once it holds a model
+    slot (Overloaded is raised before that). The chunks still need a Sanitizer.
+    """
+    key = cache_key(category, profile)
+    cached = _lookup(clean_key(key)) or _lookup(key)
+    if cached is not None:
+        yield cached
+        return
+
+    def generate():
+        prompt_text = _prompt_for(category, profile)
+        parts = []
+        with llm_gate.slot(), timed(f"llm_{category}_stream"):
+            yield ""  # admitted; lets the caller send its response headers
+            for chunk in get_llm().stream(prompt_text, config={"callbacks": [token_callback(category)]}):
+                parts.append(chunk)
+                yield chunk
+        raw = "".join(parts)
+        response_cache.set(key, raw)
+        response_cache.set(clean_key(key), sanitize(category, raw))
+
+    yield from inflight.stream(key, generate)
+
+def generate_bundle():
+    """
+    Generate all three sections for one profile.
+    The important list runs alongside the food -> routine pipeline, so the
+    wall time is that of the two dependent calls instead of four serial ones.
+    """
+    profile = read_profile()
+    important = _executor.submit(_clean, "important", profile, _important_for)
+    food = _clean("food", profile, _food_for)
+    routine = _clean("routine", profile, _routine_for)
+    return {"food": food, "routine": routine, "important": important.result()}
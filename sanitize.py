@@ -0,0 +1,199 @@
+import re
+from html import escape
+
+# One pass over the text: text runs, tags, comments, code fences, or a lone
+# "<" / "`" that does not start any of those.
+_TOKEN = re.compile(
+    r"(?P<text>[^<`]+)"
+    r"|(?P<el><(?P<close>/)?(?P<tag>[a-zA-Z][a-zA-Z0-9]*)(?P<attrs>[^'\">]*(?:(?:\"[^\"]*\"|'[^']*')[^'\">]*)*)>)"
+    r"|(?P<comment><!--.*?-->)"
+    r"|(?P<fence>```(?:html)?)"
+    r"|(?P<other>[<`])",
+    re.S,
+)
+_CLASS_ATTR = re.compile(r"""\bclass\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))""", re.I)
+# The start of a fence that may continue in the next chunk
+_PARTIAL_FENCE = re.compile(r"(?:`{1,2}|```(?:h(?:t(?:m)?)?)?)\Z")
+_PARTIAL_TAG = re.compile(r"</?[a-zA-Z!]")
+MAX_PENDING = 4096
+
+VOID_TAGS = frozenset({"br"})
+# Dropped together with everything inside them
+DROP_CONTENT_TAGS = frozenset({"script", "style", "iframe", "object", "embed", "template", "noscript", "svg", "math", "head", "title"})
+
+
+class Rules:
+    """What one category's fragment may contain (taken from its prompt template)."""
+
+    def __init__(self, tags, classes=(), icons=None, icon_class=None, max_list_items=None):
+        self.tags = frozenset(tags) | VOID_TAGS
+        self.classes = frozenset(classes)
+        self.icons = frozenset(icons) if icons else None
+        self.icon_class = icon_class
+        self.max_list_items = max_list_items
+        self._start_tags = {}
+
+    def start_tag(self, tag, attrs):
+        """(allowed classes, cleaned start tag) for a raw tag name and attribute string; memoized."""
+        key = (tag, attrs)
+        parsed = self._start_tags.get(key)
+        if parsed is None:
+            m = _CLASS_ATTR.search(attrs) if attrs else None
+            value = next(g for g in m.groups() if g is not None) if m else ""
+            classes = tuple(c for c in value.split() if c in self.classes)
+            name = tag.lower()
+            parsed = (name, classes, f'<{name} class="{" ".join(classes)}">' if classes else f"<{name}>")
+            if len(self._start_tags) > 4096:
+                self._start_tags.clear()
+            self._start_tags[key] = parsed
+        return parsed
+
+
+RULES = {
+    "food": Rules(
+        tags=("section", "div", "h3", "ul", "li", "span", "strong", "em"),
+        classes=("recommendation-section", "recommendation-card", "category-title", "recommendation-list", "material-symbols-outlined"),
+        icons=("restaurant", "nutrition", "local_drink", "favorite", "relax", "fitness_center", "bedtime"),
+        icon_class="material-symbols-outlined",
+        max_list_items=5,
+    ),
+    "routine": Rules(
+        tags=("table", "caption", "thead", "tbody", "tr", "th", "td", "strong", "em"),
+        classes=("routine-table", "highlight-row"),
+    ),
+    "important": Rules(tags=("ul", "li", "strong", "em"), max_list_items=10),
+}
+
+
+# ───────────────────────────────────────────────
+# Streaming sanitizer
+# ───────────────────────────────────────────────
+class Sanitizer:
+    """
+    Clean a model's HTML fragment chunk by chunk: code fences and comments
+    are removed, tags and classes outside the category's whitelist are
+    dropped (the text of unknown tags is kept, that of <script> and the like
+    is not), all other attributes are removed, icons must be in the allowed
+    set, lists are cut to `max_list_items`, text outside the root element is
+    dropped and unclosed tags are closed at the end.
+    """
+
+    def __init__(self, category):
+        self.rules = RULES[category]
+        self._pending = ""
+        self._stack = []          # open whitelisted tags
+        self._list_counts = []    # <li> seen in each open <ul>/<ol>
+        self._skip_depth = 0      # > 0 while inside dropped content
+        self._skip_tag = None
+        self._in_icon = False
+        self._icon_text = ""
+
+    def feed(self, chunk):
+        text = self._pending + chunk
+        # Hold back a tag or comment that is not closed yet, or the start of a fence
+        cut = text.rfind("<")
+        if cut == -1 or text.find(">", cut) != -1 or len(text) - cut > MAX_PENDING:
+            fence = _PARTIAL_FENCE.search(text, max(0, len(text) - 6))
+            cut = fence.start() if fence else len(text)
+        self._pending = text[cut:]
+        return self._run(text[:cut])
+
+    def close(self):
+        # A cut-off tag at the very end is dropped; anything else left over is text
+        text, self._pending = self._pending, ""
+        out = []
+        if text and not _PARTIAL_TAG.match(text):
+            out.append(self._run(text.replace("`", "").replace("<", "&lt;")))
+        if self._in_icon:
+            self._stack.pop()
+            out.append(self._finish_icon())
+        while self._stack:
+            out.append(f"</{self._stack.pop()}>")
+        return "".join(out)
+
+    def _run(self, text):
+        out = []
+        for m in _TOKEN.finditer(text):
+            kind = m.lastgroup
+            if kind == "text":
+                self._text(m.group(), out)
+            elif kind == "el":
+                if m.group("close"):
+                    self._end_tag(m.group("tag").lower(), out)
+                else:
+                    self._start_tag(m.group("tag"), m.group("attrs"), out)
+            elif kind == "other" and m.group() == "<":
+                self._text("&lt;", out)
+            # comments, fences and stray backticks are dropped
+        return "".join(out)
+
+    def _text(self, text, out):
+        if self._skip_depth or not self._stack:
+            return
+        if self._in_icon:
+            self._icon_text += text
+            return
+        out.append(text)
+
+    def _start_tag(self, raw_tag, attrs, out):
+        tag, classes, html = self.rules.start_tag(raw_tag, attrs)
+        if self._skip_depth:
+            if tag == self._skip_tag:
+                self._skip_depth += 1
+            return
+        rules = self.rules
+        if tag in DROP_CONTENT_TAGS:
+            self._skip_tag, self._skip_depth = tag, 1
+            return
+        if tag not in rules.tags or self._in_icon:
+            return
+        if tag == "li" and self._list_counts:
+            self._list_counts[-1] += 1
+            if rules.max_list_items and self._list_counts[-1] > rules.max_list_items:
+                self._skip_tag, self._skip_depth = "li", 1
+                return
+        if tag in VOID_TAGS:
+            if self._stack:
+                out.append(f"<{tag}>")
+            return
+        if rules.icon_class and rules.icon_class in classes:
+            self._in_icon, self._icon_text = True, ""
+            self._stack.append(tag)
+            return
+        self._stack.append(tag)
+        if tag in ("ul", "ol"):
+            self._list_counts.append(0)
+        out.append(html)
+
+    def _end_tag(self, tag, out):
+        if self._skip_depth:
+            if tag == self._skip_tag:
+                self._skip_depth -= 1
+            return
+        if tag not in self._stack:
+            return
+        # Close anything left open inside it
+        while self._stack:
+            open_tag = self._stack.pop()
+            if self._in_icon:
+                out.append(self._finish_icon())
+            else:
+                out.append(f"</{open_tag}>")
+            if open_tag in ("ul", "ol"):
+                self._list_counts.pop()
+            if open_tag == tag:
+                break
+
+    def _finish_icon(self):
+        """The icon <span> is only kept if its name is an allowed icon."""
+        self._in_icon = False
+        name = self._icon_text.strip()
+        if self.rules.icons is not None and name not in self.rules.icons:
+            return ""
+        return f'<span class="{self.rules.icon_class}">{escape(name)}</span>'
+
+
+def sanitize(category, html):
+    """Clean a complete fragment (see Sanitizer)."""
+    sanitizer = Sanitizer(category)
+    return sanitizer.feed(html or "") + sanitizer.close()
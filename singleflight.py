@@ -0,0 +1,92 @@
+import threading
+from concurrent.futures import Future
+
+
+# ───────────────────────────────────────────────
+# Coalesce identical in-flight calls
+# ───────────────────────────────────────────────
+class SingleFlight:
+    """
+    Run at most one call per key at a time. Callers that arrive while a call
+    for the same key is running wait for it and receive the same result (or
+    exception) instead of starting their own.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def _join(self, key):
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = Future()
+            self._calls[key] = future
+            self.calls += 1
+            return future, True
+
+    def _finish(self, key, future, result=None, error=None):
+        with self._lock:
+            del self._calls[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key, fn):
+        future, leader = self._join(key)
+        if not leader:
+            return future.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result=result)
+        return result
+
+    def stream(self, key, fn):
+        """
+        do() for a call that produces a stream of string chunks: the leader
+        yields them as they arrive, and callers that join meanwhile (streaming
+        or not) get the joined result once it is complete, in one piece.
+        """
+        future, leader = self._join(key)
+        if not leader:
+            yield future.result()
+            return
+        parts = []
+        chunks = iter(fn())
+        try:
+            for chunk in chunks:
+                parts.append(chunk)
+                yield chunk
+        except GeneratorExit:
+            # The leader's client went away: finish the call in the background,
+            # for the callers waiting on it (and whatever fn() does at the end)
+            threading.Thread(target=self._drain, args=(key, future, chunks, parts), daemon=True).start()
+            raise
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result="".join(parts))
+
+    def _drain(self, key, future, chunks, parts):
+        try:
+            parts.extend(chunks)
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            return
+        self._finish(key, future, result="".join(parts))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._calls),
+            }
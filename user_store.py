@@ -0,0 +1,151 @@
+import atexit
+import csv
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from metrics import timed
+
+COLUMNS = ["Name", "Age", "Weight", "Height", "Disease"]
+
+
+# ───────────────────────────────────────────────
+# Buffered user-data store (SQLite, WAL mode)
+# ───────────────────────────────────────────────
+class UserStore:
+    """
+    Form submissions are queued in memory and written in batches by a
+    background thread, so a request never waits on disk. SQLite's locking
+    keeps concurrent writes from several worker processes consistent.
+    """
+
+    def __init__(self, db_path, batch_size=100, flush_interval=1.0, max_queue=10000):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._db_lock = threading.Lock()
+        self._db = self._connect()
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS users ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " created_at REAL NOT NULL,"
+            " name TEXT, age TEXT, weight TEXT, height TEXT, disease TEXT)"
+        )
+        self._db.commit()
+        self._writer = threading.Thread(target=self._run, name="user-store-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.flush)
+
+    def _connect(self):
+        folder = os.path.dirname(self.db_path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        db = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def append(self, name, age, weight, height, disease_list):
+        row = (time.time(), name, age, weight, height, ";".join(disease_list))
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            # Writer is behind: write this row directly rather than dropping it
+            self._write([row])
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            except Exception as e:
+                print(f"[ERROR] Failed to save {len(batch)} user rows: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, rows):
+        with self._db_lock, timed("user_store_write"):
+            with self._db:
+                self._db.executemany(
+                    "INSERT INTO users (created_at, name, age, weight, height, disease) VALUES (?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+
+    def flush(self):
+        """Block until everything queued so far has been written."""
+        self._queue.join()
+
+    def page(self, page=1, per_page=50):
+        """Rows for one page, newest first, plus whether an older page exists."""
+        offset = (max(page, 1) - 1) * per_page
+        with self._db_lock:
+            rows = self._db.execute(
+                "SELECT name, age, weight, height, disease FROM users ORDER BY id DESC LIMIT ? OFFSET ?",
+                (per_page + 1, offset),
+            ).fetchall()
+        return rows[:per_page], len(rows) > per_page
+
+    def iter_rows(self, chunk_size=500):
+        """All rows, oldest first, fetched in chunks (for streaming exports)."""
+        last_id = 0
+        while True:
+            with self._db_lock:
+                rows = self._db.execute(
+                    "SELECT id, name, age, weight, height, disease FROM users WHERE id > ? ORDER BY id LIMIT ?",
+                    (last_id, chunk_size),
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield row[1:]
+            last_id = rows[-1][0]
+
+    def import_csv(self, path):
+        """One-time import of the old user_data.csv when the table is still empty."""
+        if not os.path.exists(path) or self._has_rows():
+            return 0
+        imported = 0
+
+        def rows(reader):
+            nonlocal imported
+            next(reader, None)  # header
+            for row in reader:
+                if len(row) >= 5:
+                    imported += 1
+                    yield (time.time(), *row[:5])
+
+        with self._db_lock, open(path, newline="") as csvfile:
+            # Check and insert in one write transaction so only one worker imports
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                if self._db.execute("SELECT 1 FROM users LIMIT 1").fetchone():
+                    self._db.rollback()
+                    return 0
+                self._db.executemany(
+                    "INSERT INTO users (created_at, name, age, weight, height, disease) VALUES (?, ?, ?, ?, ?, ?)",
+                    rows(csv.reader(csvfile)),
+                )
+                self._db.commit()
+            except Exception:
+                self._db.rollback()
+                raise
+        if imported:
+            print(f"✅ Imported {imported} rows from {path}")
+        return imported
+
+    def _has_rows(self):
+        with self._db_lock:
+            return self._db.execute("SELECT 1 FROM users LIMIT 1").fetchone() is not None